@@ -0,0 +1,85 @@
+"""
+Compare the shallow clone used by clone_repository with the blob-less
+sparse clone, on a local fixture repo full of files analysis throws away.
+
+    cd backend && python benchmarks/bench_clone.py
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.git_objects import partial_clone
+from utils.filters import sparse_checkout_patterns
+
+
+def git(*args, cwd=None):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def build_fixture(root: Path) -> str:
+    """Small Python package plus images, a dataset and vendored node_modules"""
+    src = root / "fixture"
+    (src / "pkg").mkdir(parents=True)
+    for i in range(50):
+        (src / "pkg" / f"module_{i}.py").write_text(
+            f'"""Module {i}."""\n\ndef run_{i}(x):\n    """Run step {i}."""\n    return x + {i}\n'
+        )
+    (src / "assets").mkdir()
+    for i in range(20):
+        (src / "assets" / f"image_{i}.png").write_bytes(os.urandom(512 * 1024))
+    (src / "data").mkdir()
+    (src / "data" / "dataset.csv").write_bytes(os.urandom(8 * 1024 * 1024))
+    for i in range(300):
+        pkg = src / "node_modules" / f"dep_{i}"
+        pkg.mkdir(parents=True)
+        (pkg / "index.js").write_bytes(os.urandom(16 * 1024))
+        (pkg / "helper.py").write_text("def helper():\n    pass\n")
+
+    git("init", "--quiet", "-b", "master", cwd=src)
+    git("add", "-A", cwd=src)
+    git("-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "--quiet", "-m", "fixture", cwd=src)
+    # Local servers refuse --filter unless told otherwise; GitHub allows it
+    git("config", "uploadpack.allowFilter", "true", cwd=src)
+    return f"file://{src}"
+
+
+def dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def measure(name: str, clone, url: str, dest: Path):
+    started = time.perf_counter()
+    clone(url, str(dest))
+    elapsed = time.perf_counter() - started
+    objects = dir_size(dest / ".git" / "objects")
+    files = sum(1 for f in dest.rglob("*") if f.is_file() and ".git" not in f.parts)
+    print(f"{name:<10} {elapsed:8.3f}s {objects / 1024 / 1024:10.2f} MB {files:8d}")
+
+
+def shallow(url: str, dest: str):
+    git("clone", "--quiet", "--depth=1", "--single-branch", "--branch", "master", url, dest)
+
+
+def partial(url: str, dest: str):
+    partial_clone(url, "master", dest, sparse_checkout_patterns())
+
+
+def main():
+    root = Path(tempfile.mkdtemp(prefix="bench-clone-"))
+    try:
+        url = build_fixture(root)
+        print(f"{'strategy':<10} {'time':>9} {'transferred':>13} {'files':>8}")
+        measure("shallow", shallow, url, root / "shallow")
+        measure("partial", partial, url, root / "partial")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
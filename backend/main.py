@@ -1,12 +1,22 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from services.doc_gen import router
+from services.doc_gen import router, job_workers
 from services.auth import auth_router
 from routers.docs import doc_router
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
 
 load_dotenv()
-app = FastAPI(title="OptimizedDocGenerator", version="2.0")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_workers.start()  # also requeues jobs a crashed process left running
+    yield
+    job_workers.stop()
+
+
+app = FastAPI(title="OptimizedDocGenerator", version="2.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],
@@ -1,6 +1,8 @@
+import asyncio
 from fastapi import APIRouter
-from services.doc_generator import generate_docs_for_file
-from utils.markdown import generate_markdown
+from fastapi.responses import StreamingResponse
+from services.doc_generator import generate_docs_for_file, request_slots
+from utils.markdown import generate_markdown, file_section, PROJECT_HEADER
 
 doc_router = APIRouter()
 
@@ -13,11 +15,12 @@ async def generate_docs(files: dict):
     }
     """
 
-    docs = []
-
-    for filename, code in files.items():
-        doc = await generate_docs_for_file(filename, code)
-        docs.append(doc)
+    # Files and their chunks fan out together under one per-request cap;
+    # results come back in upload order
+    limit = request_slots()
+    docs = list(await asyncio.gather(*(
+        generate_docs_for_file(filename, code, limit) for filename, code in files.items()
+    )))
 
     markdown = generate_markdown(docs)
 
@@ -25,3 +28,28 @@ async def generate_docs(files: dict):
         "docs": docs,
         "markdown": markdown
     }
+
+@doc_router.post("/generate-doc/markdown")
+async def generate_docs_markdown(files: dict):
+    """
+    Same input as /generate-doc; the markdown is streamed back a file
+    section at a time, in upload order, as soon as each file is ready.
+    """
+
+    async def sections():
+        # Started only once the response streams, so the finally below
+        # always owns them
+        limit = request_slots()
+        tasks = [
+            asyncio.create_task(generate_docs_for_file(filename, code, limit))
+            for filename, code in files.items()
+        ]
+        try:
+            yield PROJECT_HEADER
+            for task in tasks:
+                yield file_section(await task)
+        finally:
+            for task in tasks:
+                task.cancel()  # client went away: stop the remaining analyses
+
+    return StreamingResponse(sections(), media_type="text/markdown; charset=utf-8")
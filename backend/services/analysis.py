@@ -0,0 +1,126 @@
+import os
+import ast
+import threading
+import multiprocessing
+from pathlib import Path
+from typing import List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.git_objects import git_blob_sha
+from services.reference import render_reference
+
+# Kept free of FastAPI/DB imports: worker processes import this module on spawn.
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+AST_PROCESS_WORKERS = int(os.environ.get("AST_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+AST_BATCH_SIZE = int(os.environ.get("AST_BATCH_SIZE", "32"))
+# Below this many files, process startup and IPC cost more than they save
+PROCESS_POOL_MIN_FILES = int(os.environ.get("PROCESS_POOL_MIN_FILES", "200"))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+# ============================================================================
+# CODE ANALYSIS
+# ============================================================================
+
+def analyze_source(content: str) -> Optional[str]:
+    """Extract meaningful code structure from source text"""
+    try:
+        # Quick size check - skip very large or empty files
+        if len(content) < 10 or len(content) > 100_000:
+            return None
+        
+        tree = ast.parse(content)
+        elements = []
+        
+        # Module docstring
+        if doc := ast.get_docstring(tree):
+            elements.append(f"MODULE: {doc[:200]}")
+        
+        # Classes and functions
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ClassDef):
+                doc = ast.get_docstring(node) or "No description"
+                elements.append(f"CLASS {node.name}: {doc[:150]}")
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if not node.name.startswith("_"):  # Skip private functions
+                    doc = ast.get_docstring(node) or "No description"
+                    elements.append(f"FUNCTION {node.name}: {doc[:150]}")
+        
+        return "\n".join(elements) if elements else None
+        
+    except Exception:
+        return None
+
+
+def analyze_bytes(data: bytes, blob_sha: str = "") -> Tuple[str, Optional[str]]:
+    """Git blob id and extracted structure of raw file contents"""
+    return blob_sha or git_blob_sha(data), analyze_source(data.decode("utf-8", errors="ignore"))
+
+
+def reference_bytes(data: bytes, blob_sha: str = "") -> Tuple[str, Optional[str]]:
+    """Git blob id and markdown API reference of raw file contents"""
+    return blob_sha or git_blob_sha(data), render_reference(data.decode("utf-8", errors="ignore"))
+
+
+def hybrid_bytes(data: bytes, blob_sha: str = "") -> Tuple[str, Optional[Tuple[Optional[str], str]]]:
+    """Git blob id and (structure summary, API reference); None if there is no reference"""
+    source = data.decode("utf-8", errors="ignore")
+    reference = render_reference(source)
+    return blob_sha or git_blob_sha(data), (analyze_source(source), reference) if reference else None
+
+
+# What analyze_batch extracts from each file, by kind
+ANALYZERS = {"structure": analyze_bytes, "reference": reference_bytes, "hybrid": hybrid_bytes}
+
+
+def analyze_batch(batch: List[Tuple[str, str, Optional[bytes], Optional[str]]],
+                  kind: str = "structure") -> List[Tuple[str, str, Optional[str]]]:
+    """Analyse many files in one worker call to keep per-file IPC small.
+
+    Each item is (path, blob_sha, data, fs_path); files given by path are
+    read inside the worker. Returns (path, blob_sha, result of the `kind`
+    analyzer) per file.
+    """
+    analyzer = ANALYZERS[kind]
+    results = []
+    for path, blob_sha, data, fs_path in batch:
+        try:
+            if data is None:
+                data = Path(fs_path).read_bytes()
+            results.append((path, *analyzer(data, blob_sha)))
+        except Exception:
+            results.append((path, blob_sha, None))
+    return results
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Shared process pool, started once and reused by every job"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn: forking a process full of threads is not safe
+            _process_pool = ProcessPoolExecutor(
+                max_workers=AST_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def run_batch_in_pool(batch: List[Tuple[str, str, Optional[bytes], Optional[str]]],
+                      kind: str = "structure") -> List[Tuple[str, str, Optional[str]]]:
+    """analyze_batch on the shared pool, falling back to this thread if the pool died"""
+    global _process_pool
+    pool = get_process_pool()
+    try:
+        return pool.submit(analyze_batch, batch, kind).result()
+    except BrokenProcessPool:
+        with _process_pool_lock:
+            if _process_pool is pool:
+                _process_pool = None  # next batch starts a fresh pool
+        return analyze_batch(batch, kind)
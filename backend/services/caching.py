@@ -2,13 +2,15 @@ from pathlib import Path
 import git,os,re
 from sqlalchemy.orm import Session
 # DB & storage imports (add near other imports)
-from sqlalchemy import create_engine, Column, String, DateTime, Integer, Text
+from sqlalchemy import create_engine, Column, String, DateTime, Integer, Text, inspect, text, func
 from sqlalchemy.orm import sessionmaker, declarative_base
 from datetime import datetime
-import hashlib
+from typing import Dict, Optional
 import urllib.parse
 
 DB_PATH = os.environ.get("DOCGEN_DB", "sqlite:///./docgen.db")
+# Commits of per-file docs kept per repo/branch/theme/model; older ones are pruned
+FILE_DOC_CACHE_COMMITS = int(os.environ.get("FILE_DOC_CACHE_COMMITS", "3"))
 engine = create_engine(DB_PATH, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 Base = declarative_base()
@@ -26,10 +28,33 @@ class RepoCache(Base):
     commit_hash = Column(String, index=True, nullable=False)
     doc_path = Column(String, nullable=False)  # file system path to markdown/pdf
     format = Column(String, nullable=False, default="md")
+    # Each format of a document is its own row; "md" is the canonical one the others are exported from
+    theme = Column(String, nullable=True)
+    model = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class FileDocCache(Base):
+    """Per-file documentation of a cached commit, reused by incremental runs"""
+    __tablename__ = "file_doc_cache"
+    id = Column(Integer, primary_key=True, index=True)
+    repo_url = Column(String, index=True, nullable=False)
+    branch = Column(String, nullable=False, default="master")
+    commit_hash = Column(String, index=True, nullable=False)
+    theme = Column(String, nullable=True)
+    model = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    blob_sha = Column(String, nullable=False)  # git blob id of the documented source
+    documentation = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # create_all doesn't add columns to a repo_cache table from an older release
+    with engine.begin() as conn:
+        existing = {c["name"] for c in inspect(conn).get_columns("repo_cache")}
+        for name in ("theme", "model"):
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE repo_cache ADD COLUMN {name} VARCHAR"))
 
 init_db()
 
@@ -96,34 +121,124 @@ def save_final_doc_to_stoage(final_doc:str,repo_url:str,commit_hash:str,fmt:str
         outpath.write_text(final_doc,encoding="utf-8")
     return str(outpath)
 
-def get_cached_doc(db_session,repo_url:str,branch:str,commit_hash:str):
-    return db_session.query(RepoCache).filter(RepoCache.repo_url== repo_url).filter(RepoCache.branch == branch).filter(RepoCache.commit_hash == commit_hash).first()
-
 # ---------- DB helpers ----------
-def get_cached_doc(db: Session, repo_url: str, branch: str, commit_hash: str):
+def get_cached_doc(db: Session, repo_url: str, branch: str, commit_hash: str,
+                   fmt: str = "md", theme: Optional[str] = None, model: Optional[str] = None):
+    """Cached document of a commit in one format, for one theme and model"""
     return (
         db.query(RepoCache)
         .filter(
             RepoCache.repo_url == repo_url,
             RepoCache.branch == branch,
-            RepoCache.commit_hash == commit_hash
+            RepoCache.commit_hash == commit_hash,
+            RepoCache.format == fmt,
+            RepoCache.theme == theme,
+            RepoCache.model == model
         )
+        .order_by(RepoCache.id.desc())
         .first()
     )
 
-def save_cached_doc(db: Session, repo_url, branch, commit_hash, doc_path):
+def save_cached_doc(db: Session, repo_url, branch, commit_hash, doc_path,
+                    fmt: str = "md", theme: Optional[str] = None, model: Optional[str] = None):
     entry = RepoCache(
         repo_url=repo_url,
         branch=branch,
         commit_hash=commit_hash,
-        doc_path=doc_path
+        doc_path=doc_path,
+        format=fmt,
+        theme=theme,
+        model=model
     )
     db.add(entry)
     db.commit()
 
 
-             
-            
+def get_latest_cached_commit(db: Session, repo_url: str, branch: str, theme: Optional[str], model: str) -> Optional[str]:
+    """Most recent commit of this repo/branch that has per-file docs stored"""
+    entry = (
+        db.query(FileDocCache)
+        .filter(
+            FileDocCache.repo_url == repo_url,
+            FileDocCache.branch == branch,
+            FileDocCache.theme == theme,
+            FileDocCache.model == model
+        )
+        .order_by(FileDocCache.id.desc())
+        .first()
+    )
+    return entry.commit_hash if entry else None
 
+def get_cached_file_docs(db: Session, repo_url: str, branch: str, commit_hash: str,
+                         theme: Optional[str], model: str) -> Dict[str, Dict[str, str]]:
+    """Per-file docs of a cached commit, keyed by path"""
+    rows = (
+        db.query(FileDocCache)
+        .filter(
+            FileDocCache.repo_url == repo_url,
+            FileDocCache.branch == branch,
+            FileDocCache.commit_hash == commit_hash,
+            FileDocCache.theme == theme,
+            FileDocCache.model == model
+        )
+        .all()
+    )
+    return {
+        row.path: {"path": row.path, "blob_sha": row.blob_sha, "documentation": row.documentation}
+        for row in rows
+    }
 
+def save_cached_file_docs(db: Session, repo_url, branch, commit_hash, theme, model, results):
+    """Upsert per-file docs of a commit, then prune commits beyond FILE_DOC_CACHE_COMMITS.
 
+    A commit may already hold rows from a filtered run over a subset of its
+    files; the rest are added rather than skipped.
+    """
+    existing = {
+        row.path: row
+        for row in db.query(FileDocCache).filter(
+            FileDocCache.repo_url == repo_url,
+            FileDocCache.branch == branch,
+            FileDocCache.commit_hash == commit_hash,
+            FileDocCache.theme == theme,
+            FileDocCache.model == model
+        )
+    }
+    for item in results:
+        row = existing.get(item["path"])
+        if row is None:
+            db.add(FileDocCache(
+                repo_url=repo_url,
+                branch=branch,
+                commit_hash=commit_hash,
+                theme=theme,
+                model=model,
+                path=item["path"],
+                blob_sha=item["blob_sha"],
+                documentation=item["documentation"]
+            ))
+        elif row.blob_sha != item["blob_sha"] or row.documentation != item["documentation"]:
+            row.blob_sha = item["blob_sha"]
+            row.documentation = item["documentation"]
+    db.commit()
+    prune_file_docs(db, repo_url, branch, theme, model)
+
+def prune_file_docs(db: Session, repo_url, branch, theme, model, keep: int = FILE_DOC_CACHE_COMMITS):
+    """Drop per-file docs of all but the `keep` most recently stored commits"""
+    scope = (
+        FileDocCache.repo_url == repo_url,
+        FileDocCache.branch == branch,
+        FileDocCache.theme == theme,
+        FileDocCache.model == model
+    )
+    commits = (
+        db.query(FileDocCache.commit_hash)
+        .filter(*scope)
+        .group_by(FileDocCache.commit_hash)
+        .order_by(func.max(FileDocCache.id).desc())
+        .all()
+    )
+    stale = [commit for (commit,) in commits[keep:]]
+    if stale:
+        db.query(FileDocCache).filter(*scope, FileDocCache.commit_hash.in_(stale)).delete(synchronize_session=False)
+        db.commit()
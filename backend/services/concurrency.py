@@ -0,0 +1,136 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from services.llm_backends import is_backend_failure
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+LLM_ADAPTIVE_MIN = int(os.environ.get("LLM_ADAPTIVE_MIN", "1"))
+LLM_ADAPTIVE_INITIAL = int(os.environ.get("LLM_ADAPTIVE_INITIAL", "5"))
+LLM_ADAPTIVE_MAX = int(os.environ.get("LLM_ADAPTIVE_MAX", "32"))
+# Back off once seconds-per-token exceeds this multiple of the best seen
+LLM_LATENCY_TOLERANCE = float(os.environ.get("LLM_LATENCY_TOLERANCE", "2.0"))
+
+
+def _ewma(current: Optional[float], sample: float, alpha: float = 0.2) -> float:
+    return sample if current is None else current + alpha * (sample - current)
+
+
+class AdaptiveLimiter:
+    """AIMD limit on in-flight LLM calls.
+
+    Every completed call reports its latency and token count. While the
+    time per generated token stays near the best observed, and the current
+    limit is actually in use, the limit grows by about one per round trip.
+    A backend failure (5xx or transport error), or per-token latency beyond
+    `tolerance` times the baseline, multiplies the limit by `backoff`, at
+    most once per round trip. Cache hits, cancellations and the caller's
+    own errors report no tokens and leave the limit alone.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int,
+                 tolerance: float = 2.0, backoff: float = 0.7, baseline_window: int = 500):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.cond = threading.Condition()
+        self.in_flight = 0
+        self.baseline: Optional[float] = None  # best seconds per token
+        self.recent = deque(maxlen=baseline_window)
+        self.seconds_per_token: Optional[float] = None
+        self.tokens_per_second: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.last_decrease = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    @property
+    def current_limit(self) -> int:
+        return int(self.limit)
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, tokens: int = 0, error: bool = False):
+        with self.cond:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self.calls += 1
+            self.error_rate = _ewma(self.error_rate, 1.0 if error else 0.0)
+            if error:
+                self.errors += 1
+                self._decrease()
+            elif tokens:
+                self._observe(latency, tokens, saturated)
+            self.cond.notify_all()
+
+    def _observe(self, latency: float, tokens: int, saturated: bool):
+        per_token = latency / tokens
+        self.latency = _ewma(self.latency, latency)
+        self.seconds_per_token = _ewma(self.seconds_per_token, per_token)
+        self.tokens_per_second = _ewma(self.tokens_per_second, tokens / latency if latency else 0.0)
+
+        # Best of a long window: each back-off produces fresh low-load samples,
+        # while a model or hardware change still ages out eventually
+        self.recent.append(per_token)
+        self.baseline = min(self.recent)
+
+        if per_token > self.baseline * self.tolerance:
+            self._decrease()
+        elif saturated:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self.last_decrease < (self.latency or 0.0):
+            return  # already backed off during this round trip
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self.last_decrease = now
+
+    @contextmanager
+    def slot(self):
+        """Hold one in-flight slot; set `sample["tokens"]` to feed the controller"""
+        self.acquire()
+        sample = {"tokens": 0}
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield sample
+        except BaseException as e:
+            failed = is_backend_failure(e)
+            sample["tokens"] = 0
+            raise
+        finally:
+            # Always give the slot back, cancellation included
+            self.release(time.perf_counter() - started, sample["tokens"], error=failed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.cond:
+            return {
+                "limit": self.current_limit,
+                "in_flight": self.in_flight,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "latency_seconds": round(self.latency, 3) if self.latency is not None else None,
+                "tokens_per_second": round(self.tokens_per_second, 1) if self.tokens_per_second is not None else None,
+                "error_rate": round(self.error_rate, 3),
+                "calls": self.calls,
+                "errors": self.errors
+            }
+
+
+llm_limiter = AdaptiveLimiter(
+    LLM_ADAPTIVE_INITIAL, LLM_ADAPTIVE_MIN, LLM_ADAPTIVE_MAX, tolerance=LLM_LATENCY_TOLERANCE
+)
@@ -1,24 +1,47 @@
 import os
 import tempfile,time
 import shutil
-import asyncio,uuid
+import asyncio
+import hashlib
+import json
+import threading
+from contextlib import ExitStack
 from pathlib import Path
-from typing import List, Dict, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
+from typing import List, Dict, Optional, Iterable, Iterator, Callable
 from dataclasses import dataclass
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, HTTPException, BackgroundTasks
+from fastapi import Depends, FastAPI, HTTPException, Header, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse,FileResponse
 from pydantic import BaseModel, Field
-from utils.list_branches import list_remote_branches,branch_exists
+from utils.list_branches import list_remote_branches,resolve_branch_head
+from utils.git_objects import list_tree, iter_blobs, partial_clone
+from utils.filters import PathFilter, sparse_checkout_patterns
+from utils.walker import walk_files
+from utils.chunker import estimate_tokens
+from utils.markdown import iter_repository_markdown, repository_section, write_markdown
 import git
-import ollama
-import ast
 from fastapi import APIRouter
 from requests import Session
-from services.export_doc import export_document
-from services.themes import build_prompt
+from services.export_doc import export_markdown_file
+from services.themes import build_prompt, build_packed_prompt, FILE_DELIMITER
+from services.llm_cache import llm_cache
+from services.llm_engine import llm_engine
+from services.llm_backends import backend_pool
+from services.concurrency import llm_limiter
+from services.llm_client import json_output
+from services.repo_pool import mirror_pool
+from services.pipeline import Pipeline
+from services.summaries import summarize_hierarchy, HIERARCHY_SUMMARIES
+from services.facts import FACTS_SYSTEM_PROMPT, FACTS_SCHEMA, build_facts_prompt, parse_facts
+from services.facts import needs_llm, render_facts_markdown, build_render_prompt
+from services.job_queue import JobWorkerPool, enqueue, get_job, update_job, finish_job, join_flight
+from services.job_queue import add_events, get_events, job_notifier, COMPLETED, FAILED, JOB_NOTIFY_FALLBACK_SECONDS
 from services.caching import SessionLocal, get_cached_doc,save_cached_doc,get_commit_hash,STORAGE_ROOT,sanitize_filename,get_db
+from services.caching import get_latest_cached_commit,get_cached_file_docs,save_cached_file_docs,get_repo_name_from_url
+from services.analysis import run_batch_in_pool, ANALYZERS
+from services.analysis import AST_PROCESS_WORKERS, AST_BATCH_SIZE, PROCESS_POOL_MIN_FILES
+from itertools import chain, islice
 router = APIRouter()
 
 # app = FastAPI(title="OptimizedDocGenerator", version="2.0")
@@ -30,18 +53,15 @@ router = APIRouter()
 
 load_dotenv()
 
-SKIP_PATTERNS = {
-    "dirs": {
-        ".git", ".github", ".gitlab", ".vscode", ".idea", "__pycache__",
-        "node_modules", ".pytest_cache", ".mypy_cache", ".tox", "dist",
-        "build", "venv", ".venv", "env", "site-packages", "vendor",
-        ".eggs", "htmlcov", "migrations"
-    },
-    "files": {"__init__.py", "setup.py", "conftest.py"},
-    "prefixes": ("test_", ".", "_"),
-    "suffixes": (".pyc", ".pyo", ".pyd", ".so", ".dll")
-}
-job_store={}
+
+# Pack files whose summaries are small into shared prompts up to this many
+# tokens (0 = one request per file); requests can override it with pack_tokens
+LLM_PACK_TOKENS = int(os.environ.get("LLM_PACK_TOKENS", "0"))
+DOC_TOKENS_PER_FILE = 200  # num_predict of a single-file request
+PACK_BATCH_SIZE = 64  # most queued files one document worker considers for packing
+PROGRESS_FLUSH_SECONDS = 0.2  # how often per-file progress is written to the job store
+STREAM_KEEPALIVE_SECONDS = 15  # comment line sent on an idle /stream connection
+STATUS_MAX_WAIT_SECONDS = 60  # longest /status long-poll
 
 
 SYSTEM_PROMPT = """You are an expert technical writer. Create concise, clear documentation 
@@ -59,61 +79,68 @@ class FileInfo:
     path: str
     content: str
     size: int
+    blob_sha: str = ""
+    reference: Optional[str] = None  # hybrid mode: API reference rendered from the AST
+
+@dataclass
+class SourceFile:
+    """A candidate file, either on disk or already read from the object store"""
+    path: str  # repo-relative, forward slashes
+    blob_sha: str = ""
+    data: Optional[bytes] = None
+    fs_path: Optional[Path] = None
     
 class GenerateRequest(BaseModel):
     repo_url: str
     branch: str = Field(default="master")
     access_token: Optional[str] = None
     model: str = "llama3.2"
-    max_workers: int = 10
+    # Pipeline stages start all their threads up front, and queue.Queue(0) is unbounded
+    max_workers: int = Field(default=10, ge=1, le=64)  # analysis workers
+    llm_workers: Optional[int] = Field(default=None, ge=1, le=64)  # cap on concurrent LLM calls, default: adaptive limiter's max
+    queue_size: int = Field(default=64, ge=1, le=4096)  # items buffered between pipeline stages
+    analysis_engine: str = "auto"  # "thread", "process" or "auto" (process pool for large repos)
     stream: bool = False
+    mode: str = "llm"  # "llm", "reference" (AST API reference, no LLM) or "hybrid" (reference + short LLM overview)
     format: str = "md"
     theme: Optional[str] = None
+    themes: List[str] = Field(default_factory=list)  # several themes from one fact-extraction pass
+    incremental: bool = True  # reuse per-file docs of the last cached commit
+    clone_strategy: str = "mirror"  # "mirror" (persistent bare mirror + fetch), "partial" or "shallow"
+    checkout: bool = False  # mirror only: materialise a working tree instead of reading blobs
+    include: List[str] = Field(default_factory=list)  # gitignore-style globs, empty = everything
+    pack_tokens: Optional[int] = None  # prompt budget for packing small files, default LLM_PACK_TOKENS
+    exclude: List[str] = Field(default_factory=list)
+    summaries: Optional[bool] = None  # package/repository overviews, default HIERARCHY_SUMMARIES
+    priority: int = 0  # higher runs first when the job queue is backed up
+
+GENERATION_MODES = ("llm", "reference", "hybrid")
 
 class BranchRequest(BaseModel):
     repo_url: str
     access_token: Optional[str] = None
 
 @router.post("/start-generation")
-def start_generation(req: GenerateRequest, background_tasks: BackgroundTasks):
-    job_id = uuid.uuid4().hex
-
-    job_store[job_id] = {
-        "status": "queued",
-        "progress": 0,
-        "output_file": None,
-        "error": None,
-    }
-
-    # START PURE WORKER
-    background_tasks.add_task(worker_generate_docs, job_id, req)
+def start_generation(req: GenerateRequest):
+    if req.mode not in GENERATION_MODES:
+        raise HTTPException(400, f"mode must be one of {', '.join(GENERATION_MODES)}")
+    # Persisted, so any API process's workers can pick it up and report on it
+    job_id = enqueue(
+        req.model_dump(exclude={"priority"}),
+        priority=req.priority,
+        details={"format": req.format, "repo_name": get_repo_name_from_url(req.repo_url)}
+    )
+    job_workers.notify()
 
-    return {"job_id": job_id, "status": "started"}
+    response = {"job_id": job_id, "status": "started"}
+    if req.stream:
+        response["stream_url"] = f"/stream/{job_id}"
+    return response
 
 # ============================================================================
 # UTILITIES
 # ============================================================================
 
-def should_skip(path: Path) -> bool:
-    """Fast path filtering using set lookups"""
-    # Check parents for skip directories
-    if any(p.name in SKIP_PATTERNS["dirs"] for p in path.parents):
-        print(f"Skipped (dir): {path}")
-        return True
-    
-    # Check filename
-    name = path.name
-    if name in SKIP_PATTERNS["files"]:
-        print(f"Skipped (file): {name}")
-        return True
-    
-    # Check prefixes and suffixes
-    if name.startswith(SKIP_PATTERNS["prefixes"]) or name.endswith(SKIP_PATTERNS["suffixes"]):
-        print(f"Skipped (dir): {name}")
-        return True
-    
-    return False
-
 
 def safe_rmtree(path: str, retries=5):
     for i in range(retries):
@@ -139,41 +166,19 @@ def clone_repository(url: str, branch: str, token: Optional[str], dest: str) ->
     )
 
 
+def partial_clone_repository(url: str, branch: str, token: Optional[str], dest: str) -> git.Repo:
+    """Blob-less clone that only materialises files analysis will keep"""
+    if token and url.startswith("https://"):
+        url = url.replace("https://", f"https://{token}@")
+
+    partial_clone(url, branch, dest, sparse_checkout_patterns())
+    return git.Repo(dest)
+
+
 # ============================================================================
 # CODE ANALYSIS
 # ============================================================================
 
-def analyze_file(file_path: Path) -> Optional[str]:
-    """Extract meaningful code structure efficiently"""
-    try:
-        content = file_path.read_text(encoding="utf-8", errors="ignore")
-        
-        # Quick size check - skip very large or empty files
-        if len(content) < 10 or len(content) > 100_000:
-            return None
-        
-        tree = ast.parse(content)
-        elements = []
-        
-        # Module docstring
-        if doc := ast.get_docstring(tree):
-            elements.append(f"MODULE: {doc[:200]}")
-        
-        # Classes and functions
-        for node in ast.walk(tree):
-            if isinstance(node, ast.ClassDef):
-                doc = ast.get_docstring(node) or "No description"
-                elements.append(f"CLASS {node.name}: {doc[:150]}")
-            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                if not node.name.startswith("_"):  # Skip private functions
-                    doc = ast.get_docstring(node) or "No description"
-                    elements.append(f"FUNCTION {node.name}: {doc[:150]}")
-        
-        return "\n".join(elements) if elements else None
-        
-    except Exception:
-        return None
-
 print("STORAGE_ROOT:", STORAGE_ROOT, type(STORAGE_ROOT))
 
 # ============================================================================
@@ -192,28 +197,16 @@ def generate_documentation(file_info: FileInfo, model: str,theme:str) -> Optiona
 
 # Explain this file's purpose and key functionality in simple terms."""
 
-    try:
-        response = ollama.chat(
-            model=model,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt},
-                
-            ],
-            
-            options={
-                "temperature": 0.3,  # More consistent output
-                "num_predict": 200,  # Limit response length
-            },
-            stream= True
-        )
-        full_text = ""
-        for chunk in response:
-            if "message" in chunk and "content" in chunk["message"]:
-                full_text += chunk["message"]["content"]
+    options = {
+        "temperature": 0.3,  # More consistent output
+        "num_predict": DOC_TOKENS_PER_FILE,  # Limit response length
+    }
 
+    try:
+        full_text = call_llm(model, user_prompt, options)
         return {
             "path": file_info.path,
+            "blob_sha": file_info.blob_sha,
             "documentation": full_text.strip()
         }
     except Exception as e:
@@ -221,62 +214,336 @@ def generate_documentation(file_info: FileInfo, model: str,theme:str) -> Optiona
         return None
 
 
+def call_llm(model: str, user_prompt: str, options: dict,
+             system_prompt: str = SYSTEM_PROMPT, response_format=None) -> str:
+    # The adaptive limiter decides how many of these run at once
+    with llm_limiter.slot() as sample:
+        def count_token(_):
+            sample["tokens"] += 1
+        return llm_engine.chat_sync(
+            model, system_prompt, user_prompt, options,
+            on_token=count_token, response_format=response_format
+        )
+
+
+def extract_facts(file_info: FileInfo, model: str) -> Optional[Dict]:
+    """Theme-independent facts about a file; llm_cache keeps them for every later theme"""
+    try:
+        text = call_llm(
+            model, build_facts_prompt(file_info.path, file_info.content),
+            {"temperature": 0.1, "num_predict": 400},
+            system_prompt=FACTS_SYSTEM_PROMPT, response_format=FACTS_SCHEMA
+        )
+    except Exception as e:
+        print(f"Error extracting facts for {file_info.path}: {e}")
+        return None
+    return parse_facts(text)
+
+
+def generate_hybrid_documentation(file_info: FileInfo, model: str, theme: str) -> Dict[str, str]:
+    """AST reference with a short LLM overview on top; the reference alone if the LLM fails"""
+    documentation = file_info.reference
+    if file_info.content:
+        try:
+            overview = call_llm(
+                model,
+                f"{build_prompt(file_info.content, theme)}\nAn API reference follows your text, "
+                f"so write only a 2-3 sentence overview of what `{file_info.path}` is for.",
+                {"temperature": 0.3, "num_predict": 120}
+            ).strip()
+            documentation = f"{overview}\n\n{file_info.reference}"
+        except Exception as e:
+            print(f"Error generating overview for {file_info.path}: {e}")
+    return {"path": file_info.path, "blob_sha": file_info.blob_sha, "documentation": documentation}
+
+
+def generate_themed_documentation(file_info: FileInfo, model: str, themes: List[str]) -> Optional[Dict]:
+    """Extract a file's facts once, then render every requested theme from them.
+
+    Template themes cost no LLM call; the others get a short prompt holding
+    only the facts. A file whose facts can't be extracted falls back to the
+    single-theme path for each theme.
+    """
+    facts = extract_facts(file_info, model)
+    rendered = {}
+    for theme in themes:
+        if facts is None:
+            result = generate_documentation(file_info, model, theme)
+            if result is None:
+                return None
+            rendered[theme] = result["documentation"]
+        elif not needs_llm(theme):
+            rendered[theme] = render_facts_markdown(facts)
+        else:
+            try:
+                rendered[theme] = call_llm(
+                    model, build_render_prompt(file_info.path, facts, theme),
+                    {"temperature": 0.3, "num_predict": DOC_TOKENS_PER_FILE}
+                ).strip()
+            except Exception as e:
+                print(f"Error rendering {theme} docs for {file_info.path}: {e}")
+                rendered[theme] = render_facts_markdown(facts)
+    return {
+        "path": file_info.path,
+        "blob_sha": file_info.blob_sha,
+        "documentation": rendered[themes[0]],
+        "themes": rendered
+    }
+
+
+def pack_files(files: List[FileInfo], budget: int) -> List[List[FileInfo]]:
+    """Greedily group files whose summaries fit together in `budget` prompt tokens.
+
+    Files too big to share a prompt with anything come back as groups of one.
+    """
+    groups, current, used = [], [], 0
+    for file_info in sorted(files, key=lambda f: f.path):
+        tokens = estimate_tokens(file_info.content) + 16  # + delimiter line
+        if tokens * 2 > budget:
+            groups.append([file_info])
+            continue
+        if current and used + tokens > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(file_info)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def split_packed_response(text: str, paths: List[str]) -> Dict[str, str]:
+    """Per-path sections of a packed response; paths the model skipped are left out"""
+    prefix, suffix = (part.strip() for part in FILE_DELIMITER.split("{path}"))
+    wanted = set(paths)
+    sections, current = {}, None
+    for line in text.splitlines():
+        stripped = line.strip().strip("`*#").strip()  # models like to format the delimiter
+        if stripped.startswith(prefix) and stripped.endswith(suffix):
+            path = stripped[len(prefix):-len(suffix)].strip()
+            current = path if path in wanted else None
+            if current is not None:
+                sections[current] = []
+            continue
+        if current is not None:
+            sections[current].append(line)
+    return {path: "\n".join(lines).strip() for path, lines in sections.items() if "\n".join(lines).strip()}
+
+
+def generate_packed_documentation(files: List[FileInfo], model: str, theme: str) -> tuple:
+    """Document several small files with one LLM request.
+
+    Files missing from the response (or all of them, if the request fails)
+    are retried one by one. Returns (results, number of files retried).
+    """
+    if len(files) == 1:
+        result = generate_documentation(files[0], model, theme)
+        return ([result] if result else []), 0
+
+    user_prompt = build_packed_prompt([(f.path, f.content) for f in files], theme)
+    options = {"temperature": 0.3, "num_predict": DOC_TOKENS_PER_FILE * len(files)}
+    try:
+        sections = split_packed_response(call_llm(model, user_prompt, options), [f.path for f in files])
+    except Exception as e:
+        print(f"Packed request for {len(files)} files failed: {e}")
+        sections = {}
+
+    results, retry = [], []
+    for file_info in files:
+        if file_info.path in sections:
+            results.append({
+                "path": file_info.path,
+                "blob_sha": file_info.blob_sha,
+                "documentation": sections[file_info.path]
+            })
+        else:
+            retry.append(file_info)
+    for file_info in retry:
+        if result := generate_documentation(file_info, model, theme):
+            results.append(result)
+    return results, len(retry)
+
+
 # ============================================================================
 # BATCH PROCESSING
 # ============================================================================
 
-def process_repository(repo_path: Path, model: str, max_workers: int,theme: str) -> List[Dict[str, str]]:
-    """Process all files in parallel with optimal batching"""
-    
-    # Stage 1: Fast file discovery and filtering
-    py_files = [f for f in repo_path.rglob("*.py") if not should_skip(f)]
-    
-    if not py_files:
-        return []
-    
-    # Stage 2: Parallel code analysis
-    file_infos: List[FileInfo] = []
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_file = {
-            executor.submit(analyze_file, f): f for f in py_files
-        }
-        
-        for future in as_completed(future_to_file):
-            file_path = future_to_file[future]
-            try:
-                content = future.result()
-                if content:
-                    file_infos.append(FileInfo(
-                        path=str(file_path.relative_to(repo_path)),
-                        content=content,
-                        size=len(content)
-                    ))
-            except Exception:
-                continue
-    
-    if not file_infos:
-        return []
-    
-    # Sort by size (process smaller files first for better UX)
-    file_infos.sort(key=lambda x: x.size)
-    
-    # Stage 3: Parallel LLM documentation generation
+def analyze_entry(source: SourceFile, kind: str = "structure") -> tuple:
+    """Read a file once, returning its git blob id and what the `kind` analyzer extracts"""
+    data = source.data if source.data is not None else source.fs_path.read_bytes()
+    return ANALYZERS[kind](data, source.blob_sha)
+
+
+def iter_checkout_sources(repo_path: Path, path_filter: Optional[PathFilter] = None,
+                          stats: Optional[Counter] = None) -> Iterator[SourceFile]:
+    """Candidate files from a checked-out working tree"""
+    for rel_path, f in walk_files(repo_path, path_filter, stats):
+        yield SourceFile(path=rel_path, fs_path=f)
+
+
+def iter_object_sources(git_dir: Path, commit_hash: str,
+                        previous: Optional[Dict[str, Dict[str, str]]] = None,
+                        path_filter: Optional[PathFilter] = None,
+                        stats: Optional[Counter] = None) -> Iterator[SourceFile]:
+    """Candidate files streamed straight from the object store, no checkout"""
+    previous = previous or {}
+    path_filter = path_filter or PathFilter()
+    stats = stats if stats is not None else Counter()
+
+    def keep(path: str, size: int) -> bool:
+        reason = path_filter.path_reason(path)
+        # analyze_source rejects anything over 100 KB, so don't even read it
+        if reason is None and size > 100_000:
+            reason = "size"
+        if reason:
+            stats[reason] += 1
+        return reason is None
+
+    unchanged, changed = [], []
+    for entry in list_tree(git_dir, commit_hash, keep):
+        cached = previous.get(entry.path)
+        (unchanged if cached and cached["blob_sha"] == entry.blob_sha else changed).append(entry)
+
+    # Blob id already proves these match the cache; no need to read them
+    for entry in unchanged:
+        yield SourceFile(path=entry.path, blob_sha=entry.blob_sha)
+    for entry, data in iter_blobs(git_dir, changed):
+        yield SourceFile(path=entry.path, blob_sha=entry.blob_sha, data=data)
+
+
+def process_sources(sources: Iterable[SourceFile], model: str, max_workers: int, theme: str,
+                    previous: Optional[Dict[str, Dict[str, str]]] = None,
+                    llm_workers: Optional[int] = None, queue_size: int = 64,
+                    on_result: Optional[Callable[[Dict[str, str]], None]] = None,
+                    stats: Optional[Dict] = None, engine: str = "auto",
+                    pack_tokens: int = 0, themes: Optional[List[str]] = None,
+                    mode: str = "llm") -> List[Dict[str, str]]:
+    """Stream files through discovery -> analysis -> LLM stages concurrently
+
+    `previous` maps path -> cached result of an earlier commit; files whose
+    blob id is unchanged reuse that documentation instead of calling the LLM.
+    The first summaries reach the model while discovery is still running;
+    `on_result` sees each result as soon as it is ready. With `pack_tokens`,
+    small files waiting for the LLM are packed into shared requests. With
+    `themes`, each file goes through generate_themed_documentation instead
+    and its result carries a "themes" mapping (no packing). `mode` is
+    "reference" (results come straight from the AST, no LLM stage work) or
+    "hybrid" (AST reference plus a short LLM overview per file).
+    """
+    previous = previous or {}
+    kind = "structure" if mode == "llm" else mode
+
+    def to_item(path: str, blob_sha: str, extracted):
+        if cached := reuse(path, blob_sha):
+            return cached
+        if not extracted:
+            return None
+        if mode == "reference":
+            return {"path": path, "blob_sha": blob_sha, "documentation": extracted}
+        if mode == "hybrid":
+            summary, reference = extracted
+            return FileInfo(path=path, content=summary or "", size=len(reference),
+                            blob_sha=blob_sha, reference=reference)
+        return FileInfo(path=path, content=extracted, size=len(extracted), blob_sha=blob_sha)
+
+    def reuse(path: str, blob_sha: str) -> Optional[Dict[str, str]]:
+        cached = previous.get(path)
+        return cached if cached and cached["blob_sha"] == blob_sha else None
+
+    # Stage 2: code analysis (a finished result passes straight through)
+    def analyze(source: SourceFile):
+        if source.data is None and source.fs_path is None:
+            # Object store already matched the blob id against the cache
+            cached = reuse(source.path, source.blob_sha)
+            return [cached] if cached else []
+        item = to_item(source.path, *analyze_entry(source, kind))
+        return [item] if item else []
+
+    def analyze_in_processes(batch: List[SourceFile]):
+        results, payload = [], []
+        for source in batch:
+            if source.data is None and source.fs_path is None:
+                results.extend(analyze(source))
+            else:
+                fs_path = str(source.fs_path) if source.fs_path else None
+                payload.append((source.path, source.blob_sha, source.data, fs_path))
+        if payload:
+            for path, blob_sha, extracted in run_batch_in_pool(payload, kind):
+                if item := to_item(path, blob_sha, extracted):
+                    results.append(item)
+        return results
+
+    # Stage 3: LLM documentation generation (changed files only)
+    llm_counters = Counter()
+    counters_lock = threading.Lock()
+
+    def document(item):
+        if isinstance(item, dict):
+            return [item]
+        if mode == "hybrid":
+            result = generate_hybrid_documentation(item, model, theme)
+        elif themes:
+            result = generate_themed_documentation(item, model, themes)
+        else:
+            result = generate_documentation(item, model, theme)
+        with counters_lock:
+            llm_counters["requests"] += 1
+        return [result] if result else []
+
+    def document_packed(batch):
+        # Whatever is waiting for the LLM right now gets packed together
+        results = [item for item in batch if isinstance(item, dict)]
+        files = [item for item in batch if not isinstance(item, dict)]
+        for group in pack_files(files, pack_tokens):
+            documented, retried = generate_packed_documentation(group, model, theme)
+            results.extend(documented)
+            with counters_lock:
+                llm_counters["requests"] += 1 + retried
+                if len(group) > 1:
+                    llm_counters["packed_requests"] += 1
+                    llm_counters["packed_files"] += len(group) - retried
+                    llm_counters["pack_fallbacks"] += retried
+        return results
+
+    # AST work is CPU-bound, so big repos go to the process pool; peek at
+    # the first files to tell whether the repo is big enough to pay for it
+    sources = iter(sources)
+    feed = sources
+    if engine == "auto":
+        head = list(islice(sources, PROCESS_POOL_MIN_FILES))
+        engine = "process" if len(head) >= PROCESS_POOL_MIN_FILES else "thread"
+        feed = chain(head, sources)
+
+    pipeline = Pipeline(queue_size=queue_size)
+    if engine == "process":
+        # Threads only wait on worker futures; keep every process fed
+        pipeline.add_stage("analyze", analyze_in_processes, AST_PROCESS_WORKERS * 2, batch_size=AST_BATCH_SIZE)
+    else:
+        pipeline.add_stage("analyze", analyze, max_workers)
+    # Threads are only an upper bound; llm_limiter adapts the real concurrency
+    if pack_tokens and not themes and mode == "llm":
+        pipeline.add_stage("document", document_packed, llm_workers or llm_limiter.max_limit, batch_size=PACK_BATCH_SIZE)
+    else:
+        pipeline.add_stage("document", document, llm_workers or llm_limiter.max_limit)
+
     results = []
-    
-    with ThreadPoolExecutor(max_workers=min(max_workers, 5)) as executor:
-        future_to_info = {
-            executor.submit(generate_documentation, info, model, theme): info 
-            for info in file_infos
-        }
-        
-        for future in as_completed(future_to_info):
-            try:
-                if result := future.result():
-                    results.append(result)
-            except Exception:
-                continue
-    
+    run = pipeline.run(feed)
+    try:
+        for result in run:
+            results.append(result)
+            if on_result:
+                on_result(result)
+    finally:
+        # Stops the pipeline threads; chain() has no close() of its own, so
+        # release the source generator (git pipes, mirror reads) here
+        run.close()
+        if hasattr(sources, "close"):
+            sources.close()
+        if stats is not None:
+            stats.update(pipeline.stats)
+            stats["analysis_engine"] = engine
+            stats["llm"] = dict(llm_counters)
+
     return results
 
 
@@ -284,119 +551,441 @@ def process_repository(repo_path: Path, model: str, max_workers: int,theme: str)
 # API ENDPOINTS
 # ============================================================================
 
+def facts_cache_theme(theme: str) -> str:
+    return f"facts:{theme}"
+
+
+def mode_cache_theme(mode: str, theme: Optional[str]) -> Optional[str]:
+    """Theme label of per-file cache rows; the AST reference doesn't depend on the theme"""
+    if mode == "reference":
+        return "reference"
+    return f"hybrid:{theme}" if mode == "hybrid" else theme
+
+
+def load_previous_docs(db, req: GenerateRequest, commit_hash: str, themes: List[str],
+                       cache_themes: List, cache_model: str) -> Dict[str, Dict]:
+    """Per-file docs of an earlier commit; with several themes, only files cached in all of them"""
+    if not themes:
+        return get_cached_file_docs(db, req.repo_url, req.branch, commit_hash, cache_themes[0], cache_model)
+    per_theme = {
+        theme: get_cached_file_docs(db, req.repo_url, req.branch, commit_hash, cache_theme, cache_model)
+        for theme, cache_theme in zip(themes, cache_themes)
+    }
+    previous = {}
+    for path, item in per_theme[themes[0]].items():
+        docs = {theme: cached.get(path) for theme, cached in per_theme.items()}
+        if all(doc and doc["blob_sha"] == item["blob_sha"] for doc in docs.values()):
+            previous[path] = {**item, "themes": {theme: doc["documentation"] for theme, doc in docs.items()}}
+    return previous
+
+
+def export_markdown(markdown_path: Path, fmt: str) -> Path:
+    """The markdown itself, or its export to `fmt` written next to it"""
+    if fmt == "md":
+        return markdown_path
+    final_path = markdown_path.with_suffix(f".{fmt}")
+    shutil.move(export_markdown_file(str(markdown_path), fmt), final_path)
+    return final_path
+
+
+def serve_cached_doc(db, job_id: str, req: GenerateRequest, commit_hash: str) -> bool:
+    """Finish the job from RepoCache if this commit was documented before; True if it was"""
+    cached = get_cached_doc(db, req.repo_url, req.branch, commit_hash, req.format, req.theme, req.model)
+    if cached and os.path.exists(cached.doc_path):
+        finish_job(job_id, "Completed", output_file=cached.doc_path)
+        return True
+    # Documented before in another format: one conversion, no clone or LLM calls
+    markdown = get_cached_doc(db, req.repo_url, req.branch, commit_hash, "md", req.theme, req.model)
+    if markdown and os.path.exists(markdown.doc_path):
+        update_job(job_id, status="Exporting document", progress=80)
+        final_path = str(export_markdown(Path(markdown.doc_path), req.format))
+        save_cached_doc(db, req.repo_url, req.branch, commit_hash, final_path, req.format, req.theme, req.model)
+        finish_job(job_id, "Completed", output_file=final_path)
+        return True
+    return False
+
+
 def worker_generate_docs(job_id: str, req: GenerateRequest):
     db = SessionLocal()
-    tmp_dir = tempfile.mkdtemp(prefix="repo-")
+    tmp_dir = None
+    mirror_hold = ExitStack()
 
     try:
-        job_store[job_id]["status"] = "Cloning repository"
-        job_store[job_id]["progress"] = 10
-        
-        # validate branch
-        if not branch_exists(req.repo_url, req.branch, req.access_token):
-            raise Exception(f"Branch '{req.branch}' does not exist in repository")
+        update_job(job_id, status="Resolving branch", progress=5)
 
-        repo = clone_repository(req.repo_url, req.branch, req.access_token, tmp_dir)
-        repo.git.clear_cache()
-        repo.close()
-        del repo
-        repo_path = Path(tmp_dir)
-
-        # Commit hash
-        commit_hash = get_commit_hash(repo_path)
+        # validate branch and resolve its head without cloning
+        commit_hash = resolve_branch_head(req.repo_url, req.branch, req.access_token)
+        if not commit_hash:
+            raise Exception(f"Branch '{req.branch}' does not exist in repository")
 
         # Check cache
-        cached = get_cached_doc(db, req.repo_url, req.branch, commit_hash)
-        if cached:
-            job_store[job_id]["status"] = "Completed"
-            job_store[job_id]["progress"] = 100
-            job_store[job_id]["output_file"] = cached.doc_path
+        # Documents of a filtered subset are never served from or stored in RepoCache
+        filtered = bool(req.include or req.exclude)
+        # Reference and hybrid output has no per-theme variants
+        themes = req.themes if req.mode == "llm" else []
+        want_summaries = (HIERARCHY_SUMMARIES if req.summaries is None else req.summaries) and req.mode != "reference"
+        # Multi-theme, summarised and non-LLM output differ from the one document per commit RepoCache holds
+        canonical = not filtered and not themes and not want_summaries and req.mode == "llm"
+        if canonical and serve_cached_doc(db, job_id, req, commit_hash):
             return
 
-        # Process files
-        job_store[job_id]["status"] = "Processing files"
-        job_store[job_id]["progress"] = 30
-
-        results = process_repository(repo_path, req.model, req.max_workers, req.theme)
-
-        if not results:
-            job_store[job_id]["error"] = "No documentable Python files found"
-            job_store[job_id]["status"] = "Failed"
+        stream_mirror = req.clone_strategy == "mirror" and not req.checkout
+        if stream_mirror:
+            # Fetch before coalescing: a shallow fetch only holds the head it got,
+            # which may be newer than what ls-remote saw, and everything below is
+            # keyed on the commit actually documented
+            update_job(job_id, status="Fetching repository", progress=8)
+            mirror_hold.enter_context(mirror_pool.reading(req.repo_url))  # no eviction until done
+            with mirror_pool.lock(req.repo_url):
+                fetched = mirror_pool.fetch(req.repo_url, req.branch, req.access_token)
+            if fetched != commit_hash:
+                commit_hash = fetched
+                if canonical and serve_cached_doc(db, job_id, req, commit_hash):
+                    return
+
+        # Coalesce identical requests: only one job clones and calls the LLM.
+        # Packing changes the prompts, so it is part of what makes them identical
+        pack_tokens = LLM_PACK_TOKENS if req.pack_tokens is None else req.pack_tokens
+        flight_key = hashlib.sha1(repr((
+            req.repo_url, commit_hash, req.format, req.theme, req.model,
+            sorted(req.include), sorted(req.exclude), themes, req.mode, want_summaries, pack_tokens
+        )).encode()).hexdigest()
+        leader_id = join_flight(job_id, flight_key)
+        if leader_id:
+            print(f"Job {job_id} follows {leader_id}")
             return
 
-        # Build markdown
-        job_store[job_id]["status"] = "Building Markdown"
-        job_store[job_id]["progress"] = 50
+        # Per-file cache rows of the facts path are labelled apart from single-theme ones
+        cache_themes = [facts_cache_theme(t) for t in themes] or [mode_cache_theme(req.mode, req.theme)]
+        cache_model = "" if req.mode == "reference" else req.model  # no model involved
+        previous = {}
+        last_commit = get_latest_cached_commit(db, req.repo_url, req.branch, cache_themes[0], cache_model)
+        if req.incremental and last_commit:
+            previous = load_previous_docs(db, req, last_commit, themes, cache_themes, cache_model)
+
+        update_job(job_id, status="Cloning repository", progress=10)
+
+        path_filter = PathFilter(include=req.include, exclude=req.exclude)
+        skipped = Counter()
+
+        if stream_mirror:
+            # No working tree at all: stream blobs of the fetched commit out of the mirror
+            sources = iter_object_sources(mirror_pool.mirror_path(req.repo_url), commit_hash, previous, path_filter, skipped)
+        else:
+            tmp_dir = tempfile.mkdtemp(prefix="repo-")
+            if req.clone_strategy == "mirror":
+                # The branch may have moved since ls-remote; document what was fetched
+                repo, commit_hash = mirror_pool.clone_into(req.repo_url, req.branch, req.access_token, tmp_dir)
+            elif req.clone_strategy == "partial":
+                repo = partial_clone_repository(req.repo_url, req.branch, req.access_token, tmp_dir)
+                commit_hash = get_commit_hash(Path(tmp_dir))
+            else:
+                repo = clone_repository(req.repo_url, req.branch, req.access_token, tmp_dir)
+                commit_hash = get_commit_hash(Path(tmp_dir))
+            repo.git.clear_cache()
+            repo.close()
+            del repo
+            sources = iter_checkout_sources(Path(tmp_dir), path_filter, skipped)
 
-        docs = ["# Repository Documentation\n"]
-        for item in results:
-            docs.append(f"## `{item['path']}`\n\n{item['documentation']}\n")
-
-        final_doc = "\n".join(docs)
+        # Process files
+        update_job(job_id, status="Processing files", progress=30, llm_concurrency=llm_limiter.current_limit)
+        files_done = [0]
+        pending = []
+        last_flush = [time.monotonic()]
+
+        def flush():
+            if pending:
+                add_events(job_id, pending)
+                pending.clear()
+            update_job(job_id, files_done=files_done[0], llm_concurrency=llm_limiter.current_limit)
+            last_flush[0] = time.monotonic()
+
+        def on_result(result):
+            files_done[0] += 1
+            # Streamed to /stream/{job_id} clients as soon as the file is documented;
+            # fast results (cache hits, AST references) are written in batches
+            pending.append(("section", {
+                "path": result["path"],
+                "markdown": repository_section(result),
+                "files_done": files_done[0]
+            }))
+            if time.monotonic() - last_flush[0] >= PROGRESS_FLUSH_SECONDS:
+                flush()
+
+        pipeline_stats = {}
+        results = process_sources(
+            sources, req.model, req.max_workers, req.theme, previous,
+            llm_workers=req.llm_workers, queue_size=req.queue_size,
+            on_result=on_result, stats=pipeline_stats, engine=req.analysis_engine,
+            pack_tokens=pack_tokens,
+            themes=themes, mode=req.mode
+        )
+        flush()
+        update_job(job_id, skipped=dict(skipped), pipeline=pipeline_stats)
 
-        # Export
-        job_store[job_id]["status"] = "Exporting document"
-        job_store[job_id]["progress"] = 80
+        if not results:
+            finish_job(job_id, "Failed", error="No documentable Python files found")
+            return
 
-        output_file = export_document(final_doc, req.format)
+        results.sort(key=lambda item: item["path"])
+        reused_files = sum(1 for item in results if previous.get(item["path"]) is item)
 
         # cache folder
         folder = STORAGE_ROOT / sanitize_filename(req.repo_url) / commit_hash
         folder.mkdir(parents=True, exist_ok=True)
 
-        final_path = folder / f"documentation.{req.format}"
-        shutil.move(output_file, final_path)
-
-        # store cache
-        save_cached_doc(
-            db,
-            repo_url=req.repo_url,
-            branch=req.branch,
-            commit_hash=commit_hash,
-            doc_path=str(final_path),
-        )
-
-        job_store[job_id]["status"] = "Completed"
-        job_store[job_id]["progress"] = 100
-        job_store[job_id]["output_file"] = str(final_path)
+        output_files = {}
+        for theme, cache_theme in zip(themes or [req.theme], cache_themes):
+            themed = results
+            if themes:
+                themed = [
+                    {"path": r["path"], "blob_sha": r["blob_sha"], "documentation": r["themes"][theme]}
+                    for r in results
+                ]
+
+            summaries = {"repository": None, "packages": {}}
+            if want_summaries:
+                update_job(job_id, status="Summarizing packages", progress=45, reused_files=reused_files)
+                summaries = summarize_hierarchy(themed, req.model, theme)
+
+            # Build markdown, written section by section next to its final place.
+            # The rendered document is never one string, but `results` holds every
+            # file's documentation until here: summaries, the per-file cache and
+            # path order all need the complete set
+            update_job(job_id, status="Building Markdown", progress=50, reused_files=reused_files)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=folder, suffix=".md", delete=False) as md_file:
+                write_markdown(iter_repository_markdown(themed, summaries), md_file)
+
+            name = "documentation"
+            if req.mode != "llm":
+                name += f"-{req.mode}"
+            if theme:
+                name += f"-{sanitize_filename(theme)}"
+            if req.mode != "reference":
+                # Cached per commit, theme and model: another model must not overwrite this file
+                name += f"-{sanitize_filename(req.model)}"
+            if want_summaries:
+                name += "-summaries"
+            if filtered:
+                name += "-" + hashlib.sha1(repr((req.include, req.exclude)).encode()).hexdigest()[:12]
+            # The markdown stays next to its export; other formats are derived from it later
+            markdown_path = folder / f"{name}.md"
+            os.replace(md_file.name, markdown_path)
+            if canonical:
+                save_cached_doc(db, req.repo_url, req.branch, commit_hash, str(markdown_path), "md", req.theme, req.model)
+
+            # Export
+            update_job(job_id, status="Exporting document", progress=80)
+            final_path = export_markdown(markdown_path, req.format)
+            if canonical and req.format != "md":
+                save_cached_doc(db, req.repo_url, req.branch, commit_hash, str(final_path), req.format, req.theme, req.model)
+            output_files[theme or "default"] = str(final_path)
+
+            save_cached_file_docs(db, req.repo_url, req.branch, commit_hash, cache_theme, cache_model, themed)
+
+        final_path = next(iter(output_files.values()))
+
+        update_job(job_id, output_files=output_files)
+        finish_job(job_id, "Completed", output_file=final_path)
 
     except Exception as e:
-        job_store[job_id]["error"] = str(e)
-        job_store[job_id]["status"] = "Failed"
+        finish_job(job_id, "Failed", error=str(e))
 
     finally:
         try:
-            import time
-            time.sleep(0.5)  # allow PDF writer to release lock
-            safe_rmtree(tmp_dir)
+            mirror_hold.close()
+            if req.clone_strategy == "mirror":
+                mirror_pool.evict(keep=mirror_pool.mirror_path(req.repo_url).name)
+            if tmp_dir:
+                time.sleep(0.5)  # allow PDF writer to release lock
+                safe_rmtree(tmp_dir)
         except Exception as cleanup_error:
             print(f"Cleanup error: {cleanup_error}")
         finally:
             db.close()
 
 
+def run_job(job_id: str, request: dict):
+    worker_generate_docs(job_id, GenerateRequest(**request))
+
+
+job_workers = JobWorkerPool(run_job)
+
+
 @router.get("/health")
 def health():
     """Health check endpoint"""
+    llm_engine.probe_sync()  # same /api/tags check as ollama.list(), on every backend
+    backends = backend_pool.stats()
+    connected = any(b["healthy"] and not b["draining"] for b in backends)
+    return {
+        "status": "healthy" if connected else "degraded",
+        "ollama": "connected" if connected else "disconnected",
+        "backends": backends,
+        "llm_cache": llm_cache.stats(),
+        "llm_concurrency": llm_limiter.stats(),
+        "json_output": json_output.stats()
+    }
+
+@router.get("/backends")
+def list_backends():
+    return backend_pool.stats()
+
+@router.post("/backends/{name}/drain")
+def drain_backend(name: str):
+    """Stop routing new LLM calls to a backend; in-flight calls finish"""
+    try:
+        backend_pool.drain(name)
+    except KeyError:
+        raise HTTPException(404, "Unknown backend")
+    return backend_pool.get(name).to_dict()
+
+@router.post("/backends/{name}/undrain")
+def undrain_backend(name: str):
     try:
-        ollama.list()  # Check if Ollama is running
-        return {"status": "healthy", "ollama": "connected"}
-    except Exception:
-        return {"status": "degraded", "ollama": "disconnected"}
+        backend_pool.drain(name, draining=False)
+    except KeyError:
+        raise HTTPException(404, "Unknown backend")
+    return backend_pool.get(name).to_dict()
+
+@router.get("/mirror-stats")
+def mirror_stats():
+    """Repository mirror pool usage and time saved by fetching"""
+    return mirror_pool.stats()
 
 @router.get("/status/{job_id}")
-def get_status(job_id:str):
-    if job_id not in job_store:
-        return HTTPException(404,"Invalid Job Id") 
-    return job_store[job_id]
+async def get_status(job_id:str, version: Optional[int] = None, wait: float = 0):
+    """
+    Job status. With `version` (from a previous response) and `wait` seconds,
+    long-polls: returns as soon as the job's version differs, or after `wait`.
+    """
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        raise HTTPException(404,"Invalid Job Id")
+
+    deadline = time.monotonic() + min(max(wait, 0), STATUS_MAX_WAIT_SECONDS)
+    while version is not None and job["version"] == version and job["state"] not in (COMPLETED, FAILED):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        await job_notifier.wait(watched_ids(job_id, job), min(remaining, JOB_NOTIFY_FALLBACK_SECONDS))
+        job = await asyncio.to_thread(get_job, job_id)
+    return job
+
+@router.websocket("/ws/status")
+async def status_socket(websocket: WebSocket):
+    """
+    Status updates for many jobs over one connection.
+    Send {"subscribe": [job_id, ...]} or {"unsubscribe": [...]}; every change is
+    pushed as the /status payload plus "job_id". Finished jobs are dropped after
+    their final update.
+    """
+    await websocket.accept()
+    sent: Dict[str, Optional[int]] = {}  # job id -> last version pushed
+    watch: Dict[str, list] = {}
+    receive = asyncio.ensure_future(websocket.receive_json())
+    try:
+        while True:
+            for job_id in list(sent):
+                job = await asyncio.to_thread(get_job, job_id)
+                if job is None:
+                    await websocket.send_json({"job_id": job_id, "error": "Invalid Job Id"})
+                    del sent[job_id]
+                    watch.pop(job_id, None)
+                    continue
+                if job["version"] != sent[job_id]:
+                    await websocket.send_json({"job_id": job_id, **job})
+                    sent[job_id] = job["version"]
+                watch[job_id] = watched_ids(job_id, job)
+                if job["state"] in (COMPLETED, FAILED):
+                    del sent[job_id]
+                    watch.pop(job_id, None)
+
+            changed = asyncio.ensure_future(job_notifier.wait(
+                [i for ids in watch.values() for i in ids], JOB_NOTIFY_FALLBACK_SECONDS
+            ))
+            done, _ = await asyncio.wait({receive, changed}, return_when=asyncio.FIRST_COMPLETED)
+            if receive not in done:
+                continue
+            changed.cancel()
+            try:
+                message = receive.result()
+            except ValueError:
+                await websocket.send_json({"error": "Expected a JSON object"})
+                message = {}
+            receive = asyncio.ensure_future(websocket.receive_json())
+            if not isinstance(message, dict):
+                continue
+            for job_id in message.get("subscribe", []):
+                sent.setdefault(job_id, None)
+            for job_id in message.get("unsubscribe", []):
+                sent.pop(job_id, None)
+                watch.pop(job_id, None)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receive.cancel()
+
+def watched_ids(job_id: str, job: Optional[dict]) -> list:
+    """A follower's changes happen on its leader's row"""
+    return [job_id] + ([job["following"]] if job and job.get("following") else [])
+
+
+
+@router.get("/stream/{job_id}")
+async def stream_job(job_id: str, format: str = "sse", last_event_id: Optional[int] = None,
+                     last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")):
+    """
+    Stream a job's stage changes and each file's documentation section as they happen.
+    format=sse (text/event-stream) or ndjson. Reconnect with the Last-Event-ID header
+    (or ?last_event_id=) to resume after the last event received.
+    """
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(400, "format must be 'sse' or 'ndjson'")
+    after = last_event_id
+    if after is None:
+        try:
+            after = int(last_event_id_header or 0)
+        except ValueError:
+            raise HTTPException(400, "Last-Event-ID must be an event id")
+    if get_events(job_id, after, limit=0) is None:
+        raise HTTPException(404, "Invalid Job Id")
+
+    def encode(event):
+        if format == "ndjson":
+            return json.dumps(event) + "\n"
+        return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    async def events():
+        nonlocal after
+        last_sent = time.monotonic()
+        while True:
+            batch = await asyncio.to_thread(get_events, job_id, after)
+            for event in batch or ():
+                after = event["id"]
+                yield encode(event)
+                if event["event"] in (COMPLETED, FAILED):
+                    return
+            if batch:
+                last_sent = time.monotonic()
+                continue
+            job = await asyncio.to_thread(get_job, job_id)
+            await job_notifier.wait(watched_ids(job_id, job), JOB_NOTIFY_FALLBACK_SECONDS)
+            if time.monotonic() - last_sent >= STREAM_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                if format == "sse":
+                    yield ": keepalive\n\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
 
 @router.get("/download/{job_id}")
-def download(job_id: str):
+def download(job_id: str, theme: Optional[str] = None):
     """
     Download the generated documentation file.
     Returns the file with appropriate headers for browser download.
     """
-    job = job_store.get(job_id)
+    job = get_job(job_id)
 
     if not job:
         raise HTTPException(status_code=404, detail="Invalid job_id")
@@ -411,6 +1000,11 @@ def download(job_id: str):
         )
 
     output_file = job.get("output_file")
+    if theme is not None:
+        # Jobs started with several themes produce one file per theme
+        output_file = job.get("output_files", {}).get(theme)
+        if output_file is None:
+            raise HTTPException(status_code=404, detail=f"No '{theme}' document in this job")
     
     if not output_file or not os.path.exists(output_file):
         raise HTTPException(status_code=404, detail="Generated file not found")
@@ -431,7 +1025,7 @@ def download(job_id: str):
     media_type = media_type_map.get(file_format, "application/octet-stream")
     
     # Create a friendly filename
-    filename = f"{repo_name}_documentation.{file_format}"
+    filename = f"{repo_name}_documentation{'_' + theme if theme else ''}.{file_format}"
     
     return FileResponse(
         path=output_file,
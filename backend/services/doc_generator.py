@@ -1,27 +1,56 @@
+import os
+import asyncio
+from typing import Optional
 from services.language import detect_language
-from services.llm_client import analyze_code
+from services.llm_client import analyze_code, normalize_analysis, LIST_FIELDS
 from utils.chunker import chunk_code
 
-async def generate_docs_for_file(filename: str, code: str):
-    language = detect_language(filename)
-    chunks = chunk_code(code)
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Chunk analyses one /generate-doc request may run at once
+DOC_REQUEST_CONCURRENCY = int(os.environ.get("DOC_REQUEST_CONCURRENCY", "4"))
+# ...and all requests together, so one big upload can't take every slot
+DOC_GLOBAL_CONCURRENCY = int(os.environ.get("DOC_GLOBAL_CONCURRENCY", "16"))
+
+global_slots = asyncio.Semaphore(DOC_GLOBAL_CONCURRENCY)
+
+
+def request_slots() -> asyncio.Semaphore:
+    """Concurrency cap for a single request's fan-out"""
+    return asyncio.Semaphore(DOC_REQUEST_CONCURRENCY)
 
-    results = []
 
-    for chunk in chunks:
-        doc = await analyze_code(chunk, language, filename)
-        results.append(doc)
+async def _analyze_chunk(chunk: str, language: str, filename: str, limit: asyncio.Semaphore):
+    async with limit, global_slots:
+        return await analyze_code(chunk, language, filename)
+
+
+async def generate_docs_for_file(filename: str, code: str, limit: Optional[asyncio.Semaphore] = None):
+    language = detect_language(filename)
+    chunks = chunk_code(code, language=language)
+    limit = limit or request_slots()
+
+    # gather keeps chunk order, so merging stays deterministic
+    results = await asyncio.gather(*(
+        _analyze_chunk(chunk, language, filename, limit) for chunk in chunks
+    ))
 
-    return merge_chunks(results)
+    return merge_chunks(list(results), filename, language)
 
 
-def merge_chunks(chunk_docs: list) -> dict:
-    base = chunk_docs[0]
+def merge_chunks(chunk_docs: list, filename: str = "", language: str = "") -> dict:
+    """One analysis from per-chunk analyses; tolerates raw strings and missing keys"""
+    docs = [normalize_analysis(doc, filename, language) for doc in chunk_docs]
+    if not docs:
+        return normalize_analysis({}, filename, language)
+    base = docs[0]
 
-    for doc in chunk_docs[1:]:
-        base["classes"].extend(doc.get("classes", []))
-        base["functions"].extend(doc.get("functions", []))
-        base["notes"].extend(doc.get("notes", []))
-        base["examples"].extend(doc.get("examples", []))
+    for doc in docs[1:]:
+        if not base["overview"]:
+            base["overview"] = doc["overview"]
+        for field in LIST_FIELDS:
+            base[field].extend(doc[field])
 
     return base
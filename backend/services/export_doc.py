@@ -36,3 +36,29 @@ def export_document(markdown_content: str, output_format: str):
         raise HTTPException(500, f"Document conversion failed: {str(e)}")
 
     return output_file  # <== ✔ return file path only
+
+
+def export_markdown_file(markdown_path: str, output_format: str) -> str:
+    """
+    Export a markdown file already on disk and return the output PATH.
+    Markdown is returned as is; pandoc reads the file itself, so the
+    document is never loaded into Python.
+    """
+    if output_format == "md":
+        return markdown_path
+
+    suffix = f".{output_format}"
+    output_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix).name
+
+    try:
+        pypandoc.convert_file(
+            markdown_path,
+            to=output_format,
+            format="md",
+            outputfile=output_file,
+            extra_args=["--standalone"]
+        )
+    except Exception as e:
+        raise HTTPException(500, f"Document conversion failed: {str(e)}")
+
+    return output_file
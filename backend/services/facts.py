@@ -0,0 +1,120 @@
+import json
+from typing import Any, Dict, Optional
+from services.themes import THEMES
+from utils.json_repair import extract_json
+
+# ============================================================================
+# THEME-INDEPENDENT FILE FACTS
+# ============================================================================
+
+FACTS_SYSTEM_PROMPT = """You are an expert software engineer. You read a summary of a source
+file and record plain facts about it: what it is for, what it is responsible for,
+its important classes and functions, and what it depends on. No opinions, no
+marketing, no formatting; only facts that documentation for any audience could use."""
+
+FACTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "purpose": {"type": "string"},
+        "responsibilities": {"type": "array", "items": {"type": "string"}},
+        "key_items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "kind": {"type": "string"},
+                    "description": {"type": "string"}
+                },
+                "required": ["name", "description"]
+            }
+        },
+        "dependencies": {"type": "array", "items": {"type": "string"}},
+        "notes": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["purpose", "key_items"]
+}
+
+
+def build_facts_prompt(path: str, content: str) -> str:
+    return f"""File: {path}
+
+Structure:
+{content}
+
+Return the facts about this file as JSON with:
+- purpose: one or two sentences on what the file is for
+- responsibilities: short list of what it takes care of
+- key_items: important classes/functions as {{name, kind, description}}
+- dependencies: other modules or services it relies on, if visible
+- notes: caveats worth documenting, if any
+"""
+
+
+def parse_facts(text: str) -> Optional[Dict[str, Any]]:
+    """Normalised facts from the model's JSON, or None if it isn't usable"""
+    data, _ = extract_json(text)
+    if not isinstance(data, dict):
+        return None
+
+    def strings(value):
+        return [str(v) for v in value if v] if isinstance(value, list) else []
+
+    items = []
+    for item in data.get("key_items") or []:
+        if isinstance(item, dict) and item.get("name"):
+            items.append({
+                "name": str(item["name"]),
+                "kind": str(item.get("kind") or ""),
+                "description": str(item.get("description") or "")
+            })
+    facts = {
+        "purpose": str(data.get("purpose") or "").strip(),
+        "responsibilities": strings(data.get("responsibilities")),
+        "key_items": items,
+        "dependencies": strings(data.get("dependencies")),
+        "notes": strings(data.get("notes"))
+    }
+    return facts if facts["purpose"] or facts["key_items"] else None
+
+
+# ============================================================================
+# RENDERING
+# ============================================================================
+
+def needs_llm(theme: Optional[str]) -> bool:
+    return THEMES.get(theme, THEMES["default"]).get("llm_render", True)
+
+
+def render_facts_markdown(facts: Dict[str, Any]) -> str:
+    """Plain markdown straight from the facts, no LLM involved"""
+    parts = []
+    if facts["purpose"]:
+        parts.append(facts["purpose"])
+    if facts["responsibilities"]:
+        parts.append("**Responsibilities**\n\n" + "\n".join(f"- {r}" for r in facts["responsibilities"]))
+    if facts["key_items"]:
+        lines = []
+        for item in facts["key_items"]:
+            kind = f" ({item['kind']})" if item["kind"] else ""
+            lines.append(f"- `{item['name']}`{kind}: {item['description']}")
+        parts.append("**Key components**\n\n" + "\n".join(lines))
+    if facts["dependencies"]:
+        parts.append("**Depends on:** " + ", ".join(f"`{d}`" for d in facts["dependencies"]))
+    if facts["notes"]:
+        parts.append("**Notes**\n\n" + "\n".join(f"- {n}" for n in facts["notes"]))
+    return "\n\n".join(parts)
+
+
+def build_render_prompt(path: str, facts: Dict[str, Any], theme: Optional[str]) -> str:
+    cfg = THEMES.get(theme, THEMES["default"])
+    return f"""Write documentation for the file `{path}` from these facts.
+
+- Tone: **{cfg['tone']}**
+- Depth of detail: **{cfg['detail']}**
+- Audience: {cfg['description']}
+- Use markdown; do not invent anything that isn't in the facts.
+
+Facts:
+{json.dumps(facts, indent=1)}
+"""
@@ -0,0 +1,514 @@
+import os
+import json
+import asyncio
+import uuid
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional
+from sqlalchemy import Column, String, DateTime, Integer, Text, inspect, text
+from sqlalchemy.exc import IntegrityError
+from services.caching import Base, engine, SessionLocal
+from cryptography.fernet import InvalidToken
+from services.auth import fernet
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "1"))
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "15"))
+# A running job whose worker hasn't checked in for this long is assumed dead
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_TTL_HOURS = float(os.environ.get("JOB_TTL_HOURS", "24"))
+# Waiters re-read the database this often, for jobs run by another process
+JOB_NOTIFY_FALLBACK_SECONDS = float(os.environ.get("JOB_NOTIFY_FALLBACK_SECONDS", "2"))
+
+# Request fields encrypted at rest (needs a shared ENCRYPTION_KEY across processes)
+SECRET_FIELDS = ("access_token",)
+
+QUEUED, RUNNING, COMPLETED, FAILED = "queued", "running", "completed", "failed"
+FOLLOWING = "following"  # waiting on an identical job instead of running
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(String, primary_key=True)
+    state = Column(String, index=True, nullable=False, default=QUEUED)
+    status = Column(String, nullable=False, default="queued")  # human readable stage
+    progress = Column(Integer, nullable=False, default=0)
+    priority = Column(Integer, index=True, nullable=False, default=0)
+    request = Column(Text, nullable=False)
+    output_file = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    details = Column(Text, nullable=False, default="{}")  # extra status fields as JSON
+    worker_id = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    leader_id = Column(String, index=True, nullable=True)  # set while FOLLOWING
+    version = Column(Integer, nullable=False, default=0)  # bumped on every change
+
+
+class JobEvent(Base):
+    """Append-only progress log of a job; the id doubles as the stream's event id"""
+    __tablename__ = "job_events"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String, index=True, nullable=False)
+    event = Column(String, nullable=False)  # stage, section, completed, failed
+    data = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class JobFlight(Base):
+    """The one job currently producing the output for a dedup key"""
+    __tablename__ = "job_flights"
+    key = Column(String, primary_key=True)
+    job_id = Column(String, index=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+Base.metadata.create_all(bind=engine)
+
+# create_all doesn't add columns to a jobs table from an older release
+with engine.begin() as conn:
+    existing = {c["name"] for c in inspect(conn).get_columns("jobs")}
+    for name, ddl in (("leader_id", "VARCHAR"), ("version", "INTEGER NOT NULL DEFAULT 0")):
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE jobs ADD COLUMN {name} {ddl}"))
+
+_COLUMNS = {"state", "status", "progress", "priority", "output_file", "error"}
+
+
+# ============================================================================
+# CHANGE NOTIFICATION
+# ============================================================================
+
+class JobNotifier:
+    """Wakes coroutines waiting on a job when this process changes it.
+
+    Writers call `publish` after committing. Changes made by another
+    process aren't seen here, so waiters also time out after
+    JOB_NOTIFY_FALLBACK_SECONDS and re-read the database.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters: Dict[str, set] = {}  # job id -> {(loop, asyncio.Event)}
+
+    def publish(self, job_ids: Iterable[str]):
+        with self.lock:
+            targets = [w for job_id in job_ids for w in self.waiters.get(job_id, ())]
+        for loop, event in targets:
+            loop.call_soon_threadsafe(event.set)
+
+    async def wait(self, job_ids: Iterable[str], timeout: float) -> bool:
+        """Wait up to `timeout` for a change to any of `job_ids`; True if one was published"""
+        job_ids = list(job_ids)
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.lock:
+            for job_id in job_ids:
+                self.waiters.setdefault(job_id, set()).add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self.lock:
+                for job_id in job_ids:
+                    waiting = self.waiters.get(job_id)
+                    if waiting is not None:
+                        waiting.discard(waiter)
+                        if not waiting:
+                            del self.waiters[job_id]
+
+
+job_notifier = JobNotifier()
+
+
+# ============================================================================
+# JOB STORE
+# ============================================================================
+
+def enqueue(request: Dict[str, Any], priority: int = 0, details: Optional[Dict[str, Any]] = None) -> str:
+    job_id = uuid.uuid4().hex
+    request = dict(request)
+    for field in SECRET_FIELDS:
+        if request.get(field):
+            request[field] = fernet.encrypt(request[field].encode()).decode()
+
+    db = SessionLocal()
+    try:
+        db.add(Job(
+            id=job_id,
+            priority=priority,
+            request=json.dumps(request),
+            details=json.dumps(details or {})
+        ))
+        db.commit()
+    finally:
+        db.close()
+    return job_id
+
+
+def _to_dict(job: Job) -> Dict[str, Any]:
+    data = json.loads(job.details or "{}")
+    data.update({
+        "status": job.status,
+        "progress": job.progress,
+        "output_file": job.output_file,
+        "error": job.error,
+        "state": job.state,
+        "priority": job.priority,
+        "version": job.version,
+    })
+    return data
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if job is None:
+            return None
+        if job.state == FOLLOWING:
+            leader = db.get(Job, job.leader_id)
+            if leader is not None:
+                # Followers report the progress of the job doing the work
+                data = _to_dict(leader)
+                data.update(priority=job.priority, following=job.leader_id)
+                return data
+        return _to_dict(job)
+    finally:
+        db.close()
+
+
+def update_job(job_id: str, **fields):
+    """Set status columns; anything else is merged into the job's details"""
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if job is None:
+            return
+        extra = {k: v for k, v in fields.items() if k not in _COLUMNS}
+        for key in fields.keys() & _COLUMNS:
+            setattr(job, key, fields[key])
+        if extra:
+            details = json.loads(job.details or "{}")
+            details.update(extra)
+            job.details = json.dumps(details)
+        if "status" in fields:
+            _add_event(db, job_id, "stage", {"status": job.status, "progress": job.progress})
+        job.version = (job.version or 0) + 1
+        job.heartbeat_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+    job_notifier.publish([job_id])
+
+
+def _add_event(db, job_id: str, event: str, data: Dict[str, Any]):
+    db.add(JobEvent(job_id=job_id, event=event, data=json.dumps(data)))
+
+
+def add_event(job_id: str, event: str, data: Dict[str, Any]):
+    add_events(job_id, [(event, data)])
+
+
+def add_events(job_id: str, events: list):
+    """Append several (event, data) pairs in one transaction"""
+    db = SessionLocal()
+    try:
+        for event, data in events:
+            _add_event(db, job_id, event, data)
+        db.commit()
+    finally:
+        db.close()
+    job_notifier.publish([job_id])
+
+
+def get_events(job_id: str, after: int = 0, limit: int = 500) -> Optional[list]:
+    """Events after id `after`; a follower reads its leader's log. None for an unknown job"""
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if job is None:
+            return None
+        events = (
+            db.query(JobEvent)
+            .filter(JobEvent.job_id == (job.leader_id or job.id), JobEvent.id > after)
+            .order_by(JobEvent.id)
+            .limit(limit)
+            .all()
+        )
+        return [{"id": e.id, "event": e.event, "data": json.loads(e.data)} for e in events]
+    finally:
+        db.close()
+
+
+def _finish(db, job: Job, status: str, output_file: Optional[str], error: Optional[str]):
+    """Finish a job together with every job following it and release its flight"""
+    values = {
+        Job.state: FAILED if error else COMPLETED,
+        Job.status: status,
+        Job.output_file: output_file,
+        Job.error: error,
+        Job.finished_at: datetime.utcnow(),
+        Job.version: Job.version + 1
+    }
+    if not error:
+        values[Job.progress] = 100
+    # Followers stop resolving through the leader once finished: give them its
+    # results (per-theme output_files, stats) alongside their own details
+    results = json.loads(job.details or "{}")
+    for follower in db.query(Job).filter(Job.leader_id == job.id):
+        details = json.loads(follower.details or "{}")
+        details.update(results)
+        follower.details = json.dumps(details)
+    db.flush()
+    db.query(Job).filter((Job.id == job.id) | (Job.leader_id == job.id)).update(
+        values, synchronize_session=False
+    )
+    db.query(JobFlight).filter(JobFlight.job_id == job.id).delete(synchronize_session=False)
+    _add_event(db, job.id, FAILED if error else COMPLETED, {
+        "status": status, "output_file": output_file, "error": error
+    })
+
+
+def finish_job(job_id: str, status: str, output_file: Optional[str] = None, error: Optional[str] = None):
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if job is not None:
+            _finish(db, job, status, output_file, error)
+            db.commit()
+    finally:
+        db.close()
+    job_notifier.publish([job_id])
+
+
+def join_flight(job_id: str, key: str) -> Optional[str]:
+    """Single-flight: claim `key` for this job, or follow the job that already holds it.
+
+    Returns the leader's id when this job became a follower, None when it
+    should do the work itself. A flight whose holder is no longer queued or
+    running (crashed mid-way) is taken over.
+    """
+    db = SessionLocal()
+    try:
+        while True:
+            flight = db.get(JobFlight, key)
+            if flight is None:
+                db.add(JobFlight(key=key, job_id=job_id))
+                try:
+                    db.commit()
+                    return None
+                except IntegrityError:
+                    db.rollback()  # lost the race; read the winner
+                    continue
+            if flight.job_id == job_id:
+                return None  # requeued leader resuming its own flight
+            leader = db.get(Job, flight.job_id)
+            if leader is None or leader.state not in (QUEUED, RUNNING):
+                taken = (
+                    db.query(JobFlight)
+                    .filter(JobFlight.key == key, JobFlight.job_id == flight.job_id)
+                    .update({JobFlight.job_id: job_id}, synchronize_session=False)
+                )
+                db.commit()
+                if taken:
+                    return None
+                db.expire_all()
+                continue
+            db.query(Job).filter(Job.id == job_id).update(
+                {Job.state: FOLLOWING, Job.leader_id: leader.id, Job.worker_id: None,
+                 Job.version: Job.version + 1},
+                synchronize_session=False
+            )
+            db.commit()
+            job_notifier.publish([job_id])
+            return leader.id
+    finally:
+        db.close()
+
+
+def claim_next(worker_id: str) -> Optional[tuple]:
+    """Atomically take the highest-priority queued job; returns (job_id, request)"""
+    db = SessionLocal()
+    try:
+        while True:
+            job = (
+                db.query(Job)
+                .filter(Job.state == QUEUED)
+                .order_by(Job.priority.desc(), Job.created_at)
+                .first()
+            )
+            if job is None:
+                return None
+            now = datetime.utcnow()
+            # Compare-and-set on state so two workers never run the same job
+            claimed = (
+                db.query(Job)
+                .filter(Job.id == job.id, Job.state == QUEUED)
+                .update({
+                    Job.state: RUNNING,
+                    Job.worker_id: worker_id,
+                    Job.attempts: Job.attempts + 1,
+                    Job.started_at: now,
+                    Job.heartbeat_at: now,
+                    Job.version: Job.version + 1
+                }, synchronize_session=False)
+            )
+            db.commit()
+            if not claimed:
+                continue
+            job_notifier.publish([job.id])
+            request = json.loads(job.request)
+            try:
+                for field in SECRET_FIELDS:
+                    if request.get(field):
+                        request[field] = fernet.decrypt(request[field].encode()).decode()
+            except InvalidToken:
+                # Encrypted under another ENCRYPTION_KEY: no retry can help
+                finish_job(job.id, "Failed", error="Stored credentials could not be decrypted; resubmit the job")
+                continue
+            return job.id, request
+    finally:
+        db.close()
+
+
+def heartbeat(job_ids):
+    if not job_ids:
+        return
+    db = SessionLocal()
+    try:
+        db.query(Job).filter(Job.id.in_(list(job_ids))).update(
+            {Job.heartbeat_at: datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def recover_stale(stale_seconds: float = JOB_STALE_SECONDS, max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+    """Requeue running jobs whose worker died; give up after max_attempts"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    db = SessionLocal()
+    try:
+        stale = db.query(Job).filter(Job.state == RUNNING, Job.heartbeat_at < cutoff).all()
+        for job in stale:
+            if job.attempts >= max_attempts:
+                _finish(db, job, "Failed", None, "Job was interrupted too many times")
+            else:
+                job.state, job.status, job.progress = QUEUED, "queued", 0
+                job.worker_id = None
+                job.version = (job.version or 0) + 1
+                _add_event(db, job.id, "stage", {"status": job.status, "progress": 0})
+        changed = [job.id for job in stale]
+        db.commit()
+        job_notifier.publish(changed)
+        return len(changed)
+    finally:
+        db.close()
+
+
+def cleanup_finished(ttl_hours: float = JOB_TTL_HOURS) -> int:
+    cutoff = datetime.utcnow() - timedelta(hours=ttl_hours)
+    db = SessionLocal()
+    try:
+        removed = (
+            db.query(Job)
+            .filter(Job.state.in_([COMPLETED, FAILED]), Job.finished_at < cutoff)
+            .delete(synchronize_session=False)
+        )
+        db.query(JobEvent).filter(~JobEvent.job_id.in_(db.query(Job.id))).delete(synchronize_session=False)
+        db.commit()
+        return removed
+    finally:
+        db.close()
+
+
+# ============================================================================
+# WORKER POOL
+# ============================================================================
+
+class JobWorkerPool:
+    """Fixed number of worker threads pulling jobs from the shared queue.
+
+    Any number of API processes can run one of these against the same
+    database. A janitor thread keeps heartbeats of this process's jobs
+    fresh, requeues jobs abandoned by crashed workers and deletes finished
+    jobs past their TTL.
+    """
+
+    def __init__(self, handler: Callable[[str, Dict[str, Any]], None], size: int = JOB_WORKERS):
+        self.handler = handler
+        self.size = size
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+        self.wakeup = threading.Event()
+        self.running: Dict[str, str] = {}  # worker name -> job id
+        self.running_lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        if self.threads:
+            return
+        recover_stale()
+        for n in range(self.size):
+            name = f"{self.worker_prefix}:{n}"
+            thread = threading.Thread(target=self._work, args=(name,), name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        janitor = threading.Thread(target=self._janitor, name="job-janitor", daemon=True)
+        janitor.start()
+        self.threads.append(janitor)
+
+    def stop(self, timeout: float = 5):
+        self.stopping.set()
+        self.wakeup.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def notify(self):
+        """Wake idle workers after an enqueue in this process"""
+        self.wakeup.set()
+
+    def _work(self, name: str):
+        while not self.stopping.is_set():
+            try:
+                claimed = claim_next(name)
+            except Exception as e:
+                print(f"Job claim failed: {e}")
+                claimed = None
+            if claimed is None:
+                self.wakeup.wait(JOB_POLL_SECONDS)
+                self.wakeup.clear()
+                continue
+            job_id, request = claimed
+            with self.running_lock:
+                self.running[name] = job_id
+            try:
+                self.handler(job_id, request)
+            except Exception as e:
+                finish_job(job_id, "Failed", error=str(e))
+            finally:
+                with self.running_lock:
+                    self.running.pop(name, None)
+
+    def _janitor(self):
+        while not self.stopping.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                with self.running_lock:
+                    running = set(self.running.values())
+                heartbeat(running)
+                recover_stale()
+                cleanup_finished()
+            except Exception as e:
+                print(f"Job janitor error: {e}")
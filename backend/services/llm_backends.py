@@ -0,0 +1,164 @@
+import os
+import time
+import asyncio
+import threading
+import urllib.parse
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+import httpx
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+OLLAMA_BACKENDS = [
+    url.strip().rstrip("/")
+    for url in os.environ.get("OLLAMA_BACKENDS", os.environ.get("OLLAMA_HOST", "http://localhost:11434")).split(",")
+    if url.strip()
+]
+BACKEND_HEALTH_INTERVAL = float(os.environ.get("BACKEND_HEALTH_INTERVAL", "10"))
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", "30"))
+
+
+class NoBackendAvailable(Exception):
+    pass
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Whether an error says something about the backend rather than the request.
+
+    Connection errors, timeouts and 5xx responses count against a backend;
+    a 4xx (unknown model, bad request) would fail on every backend alike.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class Backend:
+    """One Ollama host with its load, health and circuit-breaker state"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.name = urllib.parse.urlparse(url).netloc or url
+        self.outstanding = 0
+        self.healthy = True  # optimistic until the first probe says otherwise
+        self.draining = False
+        self.breaker = "closed"  # closed -> open -> half_open -> closed
+        self.failures = 0
+        self.opened_at = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.last_probe: Optional[float] = None
+
+    def available(self, now: float) -> bool:
+        if self.draining or not self.healthy:
+            return False
+        if self.breaker == "open":
+            if now - self.opened_at < BREAKER_COOLDOWN:
+                return False
+            self.breaker = "half_open"
+        if self.breaker == "half_open":
+            return self.outstanding == 0  # a single trial request
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "url": self.url,
+            "healthy": self.healthy,
+            "draining": self.draining,
+            "breaker": self.breaker,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors
+        }
+
+
+class BackendPool:
+    """Routes each LLM call to the available backend with the fewest outstanding requests.
+
+    Backends are probed on `/api/tags` (what `ollama.list()` calls) every
+    BACKEND_HEALTH_INTERVAL seconds. BREAKER_FAILURES consecutive failures
+    open a backend's breaker for BREAKER_COOLDOWN seconds, after which one
+    trial request decides whether it closes again. Only connection errors,
+    timeouts and 5xx responses count as failures. A drained backend gets
+    no new requests but finishes the ones it has.
+    """
+
+    def __init__(self, urls: List[str]):
+        self.backends = [Backend(url) for url in urls]
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> Backend:
+        for backend in self.backends:
+            if backend.name == name:
+                return backend
+        raise KeyError(name)
+
+    @contextmanager
+    def route(self, exclude: tuple = ()):
+        """Reserve the least loaded available backend for one request"""
+        with self.lock:
+            now = time.monotonic()
+            candidates = [b for b in self.backends if b.name not in exclude and b.available(now)]
+            if not candidates:
+                raise NoBackendAvailable("No healthy LLM backend available")
+            backend = min(candidates, key=lambda b: (b.outstanding, b.requests))
+            backend.outstanding += 1
+            backend.requests += 1
+        ok = None  # unknown: cancelled, or the request itself was at fault
+        try:
+            yield backend
+            ok = True
+        except Exception as e:
+            if is_backend_failure(e):
+                ok = False
+            raise
+        finally:
+            self._record(backend, ok)
+
+    def _record(self, backend: Backend, ok: Optional[bool]):
+        with self.lock:
+            backend.outstanding -= 1
+            if ok is None:
+                return
+            if ok:
+                backend.failures = 0
+                backend.breaker = "closed"
+                return
+            backend.errors += 1
+            backend.failures += 1
+            if backend.breaker == "half_open" or backend.failures >= BREAKER_FAILURES:
+                backend.breaker = "open"
+                backend.opened_at = time.monotonic()
+
+    def drain(self, name: str, draining: bool = True):
+        with self.lock:
+            self.get(name).draining = draining
+
+    async def probe(self, client: httpx.AsyncClient):
+        async def check(backend: Backend):
+            try:
+                response = await client.get(f"{backend.url}/api/tags", timeout=5)
+                healthy = response.status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+            with self.lock:
+                backend.healthy = healthy
+                backend.last_probe = time.time()
+
+        await asyncio.gather(*(check(b) for b in self.backends))
+
+    async def probe_forever(self, client: httpx.AsyncClient):
+        while True:
+            await self.probe(client)
+            await asyncio.sleep(BACKEND_HEALTH_INTERVAL)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [b.to_dict() for b in self.backends]
+
+
+backend_pool = BackendPool(OLLAMA_BACKENDS)
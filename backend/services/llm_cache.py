@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+import time
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+LLM_CACHE_DIR = Path(os.environ.get("LLM_CACHE_DIR", "./llm_cache"))
+LLM_CACHE_MAX_MB = int(os.environ.get("LLM_CACHE_MAX_MB", "512"))
+# Every API process shares the directory; rescan it this often so the size
+# budget and eviction order account for entries the others wrote
+LLM_CACHE_RESCAN_SECONDS = float(os.environ.get("LLM_CACHE_RESCAN_SECONDS", "60"))
+
+
+def cache_key(model: str, system_prompt: str, user_prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
+    """Content address of one LLM request"""
+    payload = json.dumps(
+        {"model": model, "system": system_prompt, "user": user_prompt, "options": options or {}},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Disk-backed LLM response cache with size-bounded LRU eviction.
+
+    Every response is one file under `root`; recency is tracked in memory
+    and rebuilt from file mtimes on startup and every `rescan_seconds`.
+    Several processes can share `root`: a key missing from this process's
+    index is still looked up on disk, and the periodic rescan keeps the
+    size budget shared rather than per process.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, rescan_seconds: float = LLM_CACHE_RESCAN_SECONDS):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.rescan_seconds = rescan_seconds
+        self.scanned_at = 0.0
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.txt"
+
+    def _load(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.root.glob("*/*.txt"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # evicted by another process mid-scan
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        self.entries = OrderedDict((key, size) for _, key, size in sorted(files))
+        self.total_bytes = sum(self.entries.values())
+        self.scanned_at = time.monotonic()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            path = self._path(key)
+            try:
+                # Not indexed may still mean written by another process
+                value = path.read_text(encoding="utf-8")
+                os.utime(path)
+            except OSError:
+                # Never cached, or removed behind our back
+                self.total_bytes -= self.entries.pop(key, 0)
+                self.misses += 1
+                return None
+            if key not in self.entries:
+                self.entries[key] = len(value.encode("utf-8"))
+                self.total_bytes += self.entries[key]
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str):
+        data = value.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        with self.lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+
+            if time.monotonic() - self.scanned_at >= self.rescan_seconds:
+                self._load()
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            old_key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+llm_cache = LLMResponseCache(LLM_CACHE_DIR, LLM_CACHE_MAX_MB * 1024 * 1024)
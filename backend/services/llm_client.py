@@ -1,7 +1,7 @@
-import requests
-import json
-
-OLLAMA_URL = "http://localhost:11434/api/chat"
+import threading
+from typing import Any, Dict, Optional
+from services.llm_engine import llm_engine
+from utils.json_repair import extract_json
 
 SYSTEM_PROMPT = """
 You are a senior software engineer and technical writer.
@@ -13,7 +13,127 @@ Rules:
 - Output valid JSON only
 """
 
-def analyze_code(code: str, language: str, filename: str) -> dict:
+_STRINGS = {"type": "array", "items": {"type": "string"}}
+
+_CALLABLE = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "params": _STRINGS,
+        "returns": {"type": "string"},
+        "description": {"type": "string"}
+    },
+    "required": ["name"]
+}
+
+# Passed to Ollama as `format`, so decoding is constrained to this shape
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "file": {"type": "string"},
+        "language": {"type": "string"},
+        "overview": {"type": "string"},
+        "classes": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "description": {"type": "string"},
+                    "methods": {"type": "array", "items": _CALLABLE}
+                },
+                "required": ["name"]
+            }
+        },
+        "functions": {"type": "array", "items": _CALLABLE},
+        "notes": _STRINGS,
+        "examples": _STRINGS
+    },
+    "required": ["overview", "classes", "functions"]
+}
+
+LIST_FIELDS = ("classes", "functions", "notes", "examples")
+
+
+# ============================================================================
+# JSON OUTPUT STATS
+# ============================================================================
+
+class JSONOutputStats:
+    """How often model JSON parsed cleanly, needed repair, or needed a re-request"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.parsed = 0
+        self.repaired = 0
+        self.retried = 0
+        self.failed = 0
+
+    def record(self, outcome: str):
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "parsed": self.parsed,
+                "repaired": self.repaired,
+                "retried": self.retried,
+                "failed": self.failed
+            }
+
+
+json_output = JSONOutputStats()
+
+
+def parse_model_json(text: str) -> Optional[Any]:
+    """First JSON value in model output, repairing truncation; None if there is none"""
+    value, repaired = extract_json(text)
+    if value is not None:
+        json_output.record("repaired" if repaired else "parsed")
+    return value
+
+
+def _as_list(value: Any) -> list:
+    return value if isinstance(value, list) else ([value] if value else [])
+
+
+def _callable(item: Any) -> Optional[dict]:
+    if isinstance(item, str) and item.strip():
+        return {"name": item.strip(), "params": []}
+    if not isinstance(item, dict) or not item.get("name"):
+        return None
+    params = item.get("params", item.get("parameters"))
+    return {**item, "name": str(item["name"]), "params": [str(p) for p in _as_list(params)]}
+
+
+def normalize_analysis(data: Any, filename: str, language: str) -> dict:
+    """Analysis dict with every key generate_markdown reads, whatever the model returned"""
+    if not isinstance(data, dict):
+        data = {"overview": data if isinstance(data, str) else ""}
+    doc = {
+        "file": str(filename or data.get("file") or ""),
+        "language": str(language or data.get("language") or ""),
+        "overview": str(data.get("overview") or "")
+    }
+    for field in LIST_FIELDS:
+        doc[field] = _as_list(data.get(field))
+
+    doc["functions"] = [fn for fn in map(_callable, doc["functions"]) if fn]
+    classes = []
+    for cls in doc["classes"]:
+        if isinstance(cls, str):
+            cls = {"name": cls}
+        if isinstance(cls, dict) and cls.get("name"):
+            methods = [m for m in map(_callable, _as_list(cls.get("methods"))) if m]
+            classes.append({**cls, "name": str(cls["name"]), "methods": methods})
+    doc["classes"] = classes
+    doc["notes"] = [str(n) for n in doc["notes"]]
+    doc["examples"] = [str(e) for e in doc["examples"]]
+    return doc
+
+
+async def analyze_code(code: str, language: str, filename: str) -> dict:
     prompt = f"""
 Language: {language}
 File: {filename}
@@ -40,25 +160,26 @@ Return JSON in this format:
 }}
 """
 
-    response = requests.post(
-        OLLAMA_URL,
-        json={
-            "model": "llama3.2",
-            "messages": [
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": prompt}
-            ],
-            "stream": False,
-            "options": {
-                "temperature": 0.1
-            }
-        },
-        timeout=120
-    )
-
-    response.raise_for_status()
-
-    content = response.json()["message"]["content"]
+    # Truncated output is repaired in place; only unusable output is asked
+    # for again, at a slightly different temperature so the response cache
+    # doesn't hand back the same answer
+    content = ""
+    for temperature in (0.1, 0.3):
+        if temperature != 0.1:
+            json_output.record("retried")
+        content = await llm_engine.chat(
+            "llama3.2",
+            SYSTEM_PROMPT,
+            prompt,
+            options={
+                "temperature": temperature
+            },
+            response_format=ANALYSIS_SCHEMA
+        )
+        data = parse_model_json(content)
+        if isinstance(data, dict):
+            return normalize_analysis(data, filename, language)
 
-    # IMPORTANT: Ollama sometimes adds text before/after JSON
-    return content
+    json_output.record("failed")
+    print(f"Unparseable analysis for {filename}, keeping the raw text")
+    return normalize_analysis(content.strip(), filename, language)
@@ -0,0 +1,161 @@
+import os
+import json
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Optional
+import httpx
+from services.llm_cache import llm_cache, cache_key
+from services.llm_backends import BackendPool, backend_pool, is_backend_failure
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "32"))  # hard ceiling
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "120"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "10"))
+
+
+class LLMEngine:
+    """Async Ollama chat client shared by every generation path.
+
+    One event loop runs in a background thread and owns a keep-alive
+    connection pool and a concurrency semaphore. Coroutines on other loops
+    (FastAPI routes) and plain threads (the repo pipeline) both hand their
+    calls to that loop, so all traffic shares one pool and one limit. Each
+    call is routed through the backend pool, and retried on another backend
+    if it fails before the first token.
+    """
+
+    def __init__(self, pool: BackendPool, max_concurrency: int, timeout: float, connect_timeout: float):
+        self.pool = pool
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.client: Optional[httpx.AsyncClient] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.start_lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self.start_lock:
+            if self.loop is None:
+                ready = threading.Event()
+
+                def run():
+                    loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(loop)
+                    self.client = httpx.AsyncClient(
+                        timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                        limits=httpx.Limits(
+                            max_connections=self.max_concurrency,
+                            max_keepalive_connections=self.max_concurrency
+                        )
+                    )
+                    self.semaphore = asyncio.Semaphore(self.max_concurrency)
+                    loop.create_task(self.pool.probe_forever(self.client))
+                    self.loop = loop
+                    ready.set()
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="llm-engine", daemon=True).start()
+                ready.wait()
+            return self.loop
+
+    async def _chat(self, model: str, system_prompt: str, user_prompt: str,
+                    options: Dict[str, Any], on_token: Optional[Callable[[str], None]],
+                    response_format: Any) -> str:
+        payload = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "stream": True,
+            "options": options
+        }
+        if response_format is not None:
+            payload["format"] = response_format
+
+        async with self.semaphore:
+            attempted = []
+            while True:
+                text = []
+                try:
+                    with self.pool.route(exclude=tuple(attempted)) as backend:
+                        await self._stream(backend.url, payload, text, on_token)
+                        return "".join(text)
+                except httpx.HTTPError as e:
+                    # A 4xx fails the same everywhere; other errors fail over
+                    # only if nothing reached the caller yet
+                    if not is_backend_failure(e):
+                        raise
+                    attempted.append(backend.name)
+                    if text or len(attempted) >= len(self.pool.backends):
+                        raise
+
+    async def _stream(self, base_url: str, payload: Dict[str, Any], text: list,
+                      on_token: Optional[Callable[[str], None]]):
+        async with self.client.stream("POST", f"{base_url}/api/chat", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise Exception(chunk["error"])
+                token = chunk.get("message", {}).get("content", "")
+                if token:
+                    text.append(token)
+                    if on_token:
+                        on_token(token)
+                if chunk.get("done"):
+                    break
+
+    def probe_sync(self):
+        """Probe every backend now instead of waiting for the next interval"""
+        loop = self._ensure_started()
+        asyncio.run_coroutine_threadsafe(self.pool.probe(self.client), loop).result()
+
+    @staticmethod
+    def _cache_key(model, system_prompt, user_prompt, options, response_format) -> str:
+        if response_format is not None:
+            options = {**options, "format": response_format}
+        return cache_key(model, system_prompt, user_prompt, options)
+
+    def _submit(self, *args):
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._chat(*args), loop)
+
+    async def chat(self, model: str, system_prompt: str, user_prompt: str,
+                   options: Optional[Dict[str, Any]] = None,
+                   on_token: Optional[Callable[[str], None]] = None,
+                   response_format: Any = None) -> str:
+        """Chat completion from any event loop, served from the response cache when possible"""
+        options = options or {}
+        key = self._cache_key(model, system_prompt, user_prompt, options, response_format)
+        # Cache reads and writes are file I/O under a lock worker threads share:
+        # keep them off the caller's event loop
+        if (cached := await asyncio.to_thread(llm_cache.get, key)) is not None:
+            return cached
+        future = self._submit(model, system_prompt, user_prompt, options, on_token, response_format)
+        text = await asyncio.wrap_future(future)
+        await asyncio.to_thread(llm_cache.put, key, text)
+        return text
+
+    def chat_sync(self, model: str, system_prompt: str, user_prompt: str,
+                  options: Optional[Dict[str, Any]] = None,
+                  on_token: Optional[Callable[[str], None]] = None,
+                  response_format: Any = None) -> str:
+        """Blocking variant for worker threads"""
+        options = options or {}
+        key = self._cache_key(model, system_prompt, user_prompt, options, response_format)
+        if (cached := llm_cache.get(key)) is not None:
+            return cached
+        future = self._submit(model, system_prompt, user_prompt, options, on_token, response_format)
+        text = future.result()
+        llm_cache.put(key, text)
+        return text
+
+
+llm_engine = LLMEngine(backend_pool, LLM_MAX_CONCURRENCY, LLM_TIMEOUT, LLM_CONNECT_TIMEOUT)
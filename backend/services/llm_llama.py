@@ -1,37 +1,23 @@
-import requests
-import json
+from services.llm_engine import llm_engine
+from services.llm_client import SYSTEM_PROMPT, json_output, parse_model_json
 
-OLLAMA_URL = "http://localhost:11434/api/chat"
 
-SYSTEM_PROMPT = """
-You are a senior software engineer and technical writer.
+async def call_llama(prompt: str, model: str = "llama3.2") -> dict:
+    for temperature in (0.1, 0.3):
+        if temperature != 0.1:
+            json_output.record("retried")
+        content = await llm_engine.chat(
+            model,
+            SYSTEM_PROMPT,
+            prompt,
+            options={
+                "temperature": temperature
+            },
+            response_format="json"
+        )
+        data = parse_model_json(content)
+        if data is not None:
+            return data
 
-Rules:
-- Generate documentation ONLY from the given code
-- Do NOT hallucinate APIs
-- Be concise and accurate
-- Output valid JSON only
-"""
-
-def call_llama(prompt: str, model: str = "llama3.2") -> dict:
-    response = requests.post(
-        OLLAMA_URL,
-        json={
-            "model": model,
-            "messages": [
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": prompt}
-            ],
-            "stream": False,
-            "options": {
-                "temperature": 0.1
-            }
-        },
-        timeout=120
-    )
-
-    response.raise_for_status()
-
-    content = response.json()["message"]["content"]
-
-    return json.loads(content)
+    json_output.record("failed")
+    raise ValueError(f"Model returned no JSON: {content[:200]!r}")
@@ -0,0 +1,142 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+_DONE = object()
+
+
+class Pipeline:
+    """Streaming pipeline of thread-pool stages joined by bounded queues.
+
+    Each stage function takes one item (or, with `batch_size` > 1, a list of
+    up to that many items already waiting in the queue) and returns an
+    iterable of items for the next stage (empty to drop it). Bounded queues
+    give backpressure: a fast stage blocks once the stage after it falls
+    `queue_size` items behind. Results of the last stage are yielded as soon as they exist.
+    """
+
+    def __init__(self, queue_size: int = 64):
+        self.queue_size = queue_size
+        self.stages: List[Dict[str, Any]] = []
+        self.cancelled = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.stats: Dict[str, Any] = {}
+
+    def add_stage(self, name: str, func: Callable[[Any], Iterable[Any]], workers: int, batch_size: int = 1):
+        self.stages.append({
+            "name": name, "func": func, "workers": max(1, workers), "batch_size": max(1, batch_size)
+        })
+        return self
+
+    # ------------------------------------------------------------------
+    # queue helpers that give up once the pipeline is cancelled
+    # ------------------------------------------------------------------
+
+    def _put(self, q: queue.Queue, item: Any):
+        while not self.cancelled.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self.cancelled.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    # ------------------------------------------------------------------
+
+    def run(self, source: Iterable[Any]) -> Iterator[Any]:
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        started = time.perf_counter()
+        self.stats = {"processed": {stage["name"]: 0 for stage in self.stages}}
+        threads = []
+
+        def feed():
+            try:
+                for item in source:
+                    if self.cancelled.is_set():
+                        break
+                    self._put(queues[0], item)
+            except BaseException as e:
+                self.error = e
+            finally:
+                for _ in range(self.stages[0]["workers"]):
+                    self._put(queues[0], _DONE)
+                # Let the generator release whatever it holds (locks, pipes)
+                if hasattr(source, "close"):
+                    source.close()
+
+        threads.append(threading.Thread(target=feed, name="pipeline-source", daemon=True))
+
+        for index, stage in enumerate(self.stages):
+            remaining = [stage["workers"]]
+            lock = threading.Lock()
+            downstream = self.stages[index + 1]["workers"] if index + 1 < len(self.stages) else 1
+
+            def work(stage=stage, q_in=queues[index], q_out=queues[index + 1],
+                     remaining=remaining, lock=lock, downstream=downstream):
+                finished = False
+                while not finished:
+                    item = self._get(q_in)
+                    if item is _DONE:
+                        break
+                    count = 1
+                    if stage["batch_size"] > 1:
+                        # Take whatever else is already queued, without waiting for more
+                        item = [item]
+                        while len(item) < stage["batch_size"]:
+                            try:
+                                extra = q_in.get_nowait()
+                            except queue.Empty:
+                                break
+                            if extra is _DONE:
+                                finished = True  # this worker's sentinel; stop after the batch
+                                break
+                            item.append(extra)
+                        count = len(item)
+                    try:
+                        outputs = stage["func"](item) or ()
+                    except Exception as e:
+                        print(f"Pipeline stage {stage['name']} failed: {e}")
+                        continue
+                    with lock:
+                        self.stats["processed"][stage["name"]] += count
+                    for out in outputs:
+                        self._put(q_out, out)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    for _ in range(downstream):
+                        self._put(q_out, _DONE)
+
+            for n in range(stage["workers"]):
+                threads.append(threading.Thread(
+                    target=work, name=f"pipeline-{stage['name']}-{n}", daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _DONE:
+                    break
+                if "first_result_seconds" not in self.stats:
+                    self.stats["first_result_seconds"] = round(time.perf_counter() - started, 3)
+                yield item
+        finally:
+            self.cancelled.set()
+            for thread in threads:
+                thread.join()
+            self.stats["total_seconds"] = round(time.perf_counter() - started, 3)
+
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,85 @@
+import ast
+from typing import List, Optional
+
+# Pure ast, no other imports: used inside the analysis worker processes.
+
+# ============================================================================
+# API REFERENCE FROM THE AST
+# ============================================================================
+
+PUBLIC_DUNDERS = {"__init__", "__call__", "__enter__", "__exit__", "__iter__", "__getitem__"}
+
+
+def _public(name: str) -> bool:
+    return not name.startswith("_") or name in PUBLIC_DUNDERS
+
+
+def _decorators(node) -> List[str]:
+    return [f"`@{ast.unparse(d)}`" for d in node.decorator_list]
+
+
+def _signature(node, owner: str = "") -> str:
+    prefix = "async def " if isinstance(node, ast.AsyncFunctionDef) else "def "
+    name = f"{owner}.{node.name}" if owner else node.name
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix}{name}({ast.unparse(node.args)}){returns}"
+
+
+def _docstring(node) -> str:
+    doc = ast.get_docstring(node)
+    return doc.strip() if doc else "*No docstring.*"
+
+
+def _function(node, level: int, owner: str = "") -> List[str]:
+    lines = [f"{'#' * level} `{_signature(node, owner)}`", ""]
+    if decorators := _decorators(node):
+        lines += [f"Decorators: {', '.join(decorators)}", ""]
+    lines += [_docstring(node), ""]
+    return lines
+
+
+def _class(node: ast.ClassDef, level: int, owner: str = "") -> List[str]:
+    name = f"{owner}.{node.name}" if owner else node.name
+    bases = [ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords]
+    heading = f"class {name}({', '.join(bases)})" if bases else f"class {name}"
+    lines = [f"{'#' * level} `{heading}`", ""]
+    if decorators := _decorators(node):
+        lines += [f"Decorators: {', '.join(decorators)}", ""]
+    lines += [_docstring(node), ""]
+
+    # Annotated class attributes (dataclasses, pydantic models)
+    fields = [
+        f"- `{ast.unparse(stmt.target)}: {ast.unparse(stmt.annotation)}`"
+        + (f" = `{ast.unparse(stmt.value)}`" if stmt.value is not None else "")
+        for stmt in node.body
+        if isinstance(stmt, ast.AnnAssign) and isinstance(stmt.target, ast.Name) and _public(stmt.target.id)
+    ]
+    if fields:
+        lines += ["Fields:", "", *fields, ""]
+
+    for child in node.body:
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and _public(child.name):
+            lines += _function(child, min(level + 1, 6), name)
+        elif isinstance(child, ast.ClassDef) and _public(child.name):
+            lines += _class(child, min(level + 1, 6), name)
+    return lines
+
+
+def render_reference(source: str, level: int = 3) -> Optional[str]:
+    """Markdown API reference of one Python module: signatures, decorators, bases, docstrings"""
+    if len(source) < 10 or len(source) > 100_000:
+        return None
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+
+    lines = []
+    if doc := ast.get_docstring(tree):
+        lines += [doc.strip(), ""]
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and _public(node.name):
+            lines += _class(node, level)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and _public(node.name):
+            lines += _function(node, level)
+    return "\n".join(lines).strip() or None
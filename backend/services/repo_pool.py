@@ -0,0 +1,216 @@
+import os
+import time
+import shutil
+import threading
+import subprocess
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+import git
+from services.caching import sanitize_filename
+
+try:
+    import fcntl  # cross-process locking, not available on Windows
+except ImportError:
+    fcntl = None
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+REPO_MIRROR_ROOT = Path(os.environ.get("REPO_MIRROR_ROOT", "./repo_mirrors"))
+REPO_MIRROR_BUDGET_MB = int(os.environ.get("REPO_MIRROR_BUDGET_MB", "5120"))
+# Commits of history fetched per branch (0 = all); documentation only reads the tip
+REPO_MIRROR_DEPTH = int(os.environ.get("REPO_MIRROR_DEPTH", "1"))
+REPO_FETCH_TIMEOUT = float(os.environ.get("REPO_FETCH_TIMEOUT", "600"))
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _run_git(*args: str, cwd: Optional[Path] = None, timeout: Optional[float] = None):
+    try:
+        result = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise Exception(f"git {args[0]} timed out after {timeout:g}s")
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip())
+    return result.stdout
+
+
+class RepoMirrorPool:
+    """On-disk pool of bare mirrors, updated with `git fetch` instead of re-cloning.
+
+    Each mirror is guarded by a per-repo lock (a thread lock plus an flock
+    on `<name>.lock` where available) and the pool is kept under a total
+    disk budget by evicting the least recently used mirrors. Jobs streaming
+    objects out of a mirror hold `reading(url)` instead, which only blocks
+    eviction, so a long read never stalls the next fetch.
+    """
+
+    def __init__(self, root: Path, budget_bytes: int):
+        self.root = Path(root)
+        self.budget_bytes = budget_bytes
+        self.guard = threading.Lock()
+        self.locks: Dict[str, threading.Lock] = {}
+        self.sizes: Dict[str, int] = {}
+        self.readers: Dict[str, int] = {}
+        self.stats_data = {
+            "clones": 0,
+            "clone_seconds": 0.0,
+            "fetches": 0,
+            "fetch_seconds": 0.0,
+            "evictions": 0,
+        }
+        self.root.mkdir(parents=True, exist_ok=True)
+        for path in self.root.glob("*.git"):
+            self.sizes[path.name] = _dir_size(path)
+
+    def _name(self, url: str) -> str:
+        return f"{sanitize_filename(url)}.git"
+
+    def mirror_path(self, url: str) -> Path:
+        return self.root / self._name(url)
+
+    @contextmanager
+    def lock(self, url: str):
+        """Exclusive access to one repository's mirror"""
+        name = self._name(url)
+        with self.guard:
+            thread_lock = self.locks.setdefault(name, threading.Lock())
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.root / f"{name}.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def reading(self, url: str):
+        """Keep a mirror from being evicted while its objects are read"""
+        name = self._name(url)
+        with self.guard:
+            self.readers[name] = self.readers.get(name, 0) + 1
+        use_file = open(self.root / f"{name}.use", "w")
+        try:
+            if fcntl is not None:
+                fcntl.flock(use_file, fcntl.LOCK_SH)
+            yield
+        finally:
+            use_file.close()  # drops the flock
+            with self.guard:
+                self.readers[name] -= 1
+
+    def fetch(self, url: str, branch: str, token: Optional[str] = None) -> str:
+        """Bring `branch` of the mirror up to date and return its head SHA.
+
+        Caller must hold `lock(url)`.
+        """
+        path = self.mirror_path(url)
+        fetch_url = url
+        if token and url.startswith("https://"):
+            fetch_url = url.replace("https://", f"https://{token}@")
+
+        is_new = not path.exists()
+        if is_new:
+            _run_git("init", "--bare", "--quiet", str(path))
+
+        started = time.perf_counter()
+        # Fetch by URL rather than a configured remote so tokens never hit disk;
+        # shallow, so the first fetch of a big repository costs what a depth=1 clone did
+        depth = [f"--depth={REPO_MIRROR_DEPTH}"] if REPO_MIRROR_DEPTH > 0 else []
+        _run_git("fetch", "--quiet", "--no-tags", "--force", *depth, fetch_url,
+                 f"+refs/heads/{branch}:refs/heads/{branch}", cwd=path, timeout=REPO_FETCH_TIMEOUT)
+        elapsed = time.perf_counter() - started
+
+        with self.guard:
+            if is_new:
+                self.stats_data["clones"] += 1
+                self.stats_data["clone_seconds"] += elapsed
+            else:
+                self.stats_data["fetches"] += 1
+                self.stats_data["fetch_seconds"] += elapsed
+            self.sizes[path.name] = _dir_size(path)
+        os.utime(path)  # mark as recently used
+
+        return _run_git("rev-parse", f"refs/heads/{branch}", cwd=path).strip()
+
+    def clone_into(self, url: str, branch: str, token: Optional[str], dest: str) -> tuple:
+        """Fetch the branch into its mirror, then check it out to `dest`.
+
+        The checkout borrows objects from the mirror (`--shared`), so no
+        network transfer happens past the fetch. Returns (repo, commit_hash).
+        """
+        with self.lock(url):
+            commit_hash = self.fetch(url, branch, token)
+            repo = git.Repo.clone_from(
+                str(self.mirror_path(url)), dest, branch=branch,
+                multi_options=["--shared", "--single-branch"],
+                allow_unsafe_options=True,
+                config='core.autocrlf=false'
+            )
+        self.evict(keep=self._name(url))
+        return repo, commit_hash
+
+    def evict(self, keep: Optional[str] = None):
+        """Remove least recently used mirrors until the pool fits its budget"""
+        with self.guard:
+            total = sum(self.sizes.values())
+            if total <= self.budget_bytes:
+                return
+            candidates = sorted(
+                (name for name in self.sizes if name != keep),
+                key=lambda name: (self.root / name).stat().st_mtime if (self.root / name).exists() else 0
+            )
+            locks = {name: self.locks.setdefault(name, threading.Lock()) for name in candidates}
+
+        for name in candidates:
+            if total <= self.budget_bytes:
+                break
+            # Never evict a mirror another job is fetching or reading
+            if self.readers.get(name) or not locks[name].acquire(blocking=False):
+                continue
+            lock_file = open(self.root / f"{name}.lock", "w")
+            use_file = open(self.root / f"{name}.use", "w")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    fcntl.flock(use_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                shutil.rmtree(self.root / name, ignore_errors=True)
+                with self.guard:
+                    total -= self.sizes.pop(name, 0)
+                    self.stats_data["evictions"] += 1
+            except OSError:
+                continue  # held by another process
+            finally:
+                use_file.close()
+                lock_file.close()
+                locks[name].release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.guard:
+            data = dict(self.stats_data)
+            data["mirrors"] = len(self.sizes)
+            data["bytes"] = sum(self.sizes.values())
+            data["budget_bytes"] = self.budget_bytes
+        # A fetch into an existing mirror replaces a full clone
+        avg_clone = data["clone_seconds"] / data["clones"] if data["clones"] else 0.0
+        data["estimated_seconds_saved"] = round(
+            max(0.0, data["fetches"] * avg_clone - data["fetch_seconds"]), 3
+        )
+        return data
+
+
+mirror_pool = RepoMirrorPool(REPO_MIRROR_ROOT, REPO_MIRROR_BUDGET_MB * 1024 * 1024)
@@ -0,0 +1,133 @@
+import os
+import posixpath
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from services.llm_engine import llm_engine
+from services.concurrency import llm_limiter
+from services.themes import THEMES
+from utils.chunker import estimate_tokens
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Off by default: it adds LLM calls per package and changes every document; requests can opt in
+HIERARCHY_SUMMARIES = os.environ.get("HIERARCHY_SUMMARIES", "0") == "1"
+# Upper bound on the inputs of one summary prompt; bigger levels are reduced in rounds
+SUMMARY_TOKEN_BUDGET = int(os.environ.get("SUMMARY_TOKEN_BUDGET", "3000"))
+SUMMARY_WORKERS = int(os.environ.get("SUMMARY_WORKERS", "8"))
+
+SUMMARY_SYSTEM_PROMPT = """You are an expert technical writer. You are given documentation
+of the parts of a software project and write a short overview of the whole:
+what it is for, how the parts fit together, and where to start reading.
+Do not repeat each part; summarise. Keep it under 200 words."""
+
+ROOT_PACKAGE = "(root)"
+
+
+def _summarize(kind: str, name: str, parts: List[Tuple[str, str]], model: str, theme: Optional[str]) -> str:
+    cfg = THEMES.get(theme, THEMES["default"])
+    body = "\n\n".join(f"### {label}\n{text}" for label, text in parts)
+    user_prompt = f"""Write an overview of the {kind} `{name}`.
+Tone: {cfg['tone']}. Depth of detail: {cfg['detail']}.
+
+Documentation of its parts:
+
+{body}
+"""
+    # Identical inputs give an identical prompt, which llm_cache answers
+    # without calling the model: unchanged packages are never regenerated
+    with llm_limiter.slot() as sample:
+        def count_token(_):
+            sample["tokens"] += 1
+        text = llm_engine.chat_sync(
+            model, SUMMARY_SYSTEM_PROMPT, user_prompt,
+            {"temperature": 0.3, "num_predict": 300}, on_token=count_token
+        )
+    return text.strip()
+
+
+def _group(parts: List[Tuple[str, str]], budget: int, min_size: int = 1) -> List[List[Tuple[str, str]]]:
+    groups, current, used = [], [], 0
+    max_chars = budget * 4
+    for label, text in parts:
+        text = text[:max_chars]  # one oversized part can't blow the prompt
+        tokens = estimate_tokens(label) + estimate_tokens(text)
+        if len(current) >= min_size and used + tokens > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append((label, text))
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def reduce_summaries(kind: str, name: str, parts: List[Tuple[str, str]], model: str,
+                     theme: Optional[str], budget: int = SUMMARY_TOKEN_BUDGET) -> str:
+    """Summarise (label, text) parts into one text, keeping each prompt within `budget` input tokens.
+
+    Parts that don't fit in one prompt are summarised in groups first, all
+    groups of a round at once, and the group summaries reduced again until
+    a single prompt suffices. Summaries are merged at least in pairs, so a
+    budget smaller than two summaries still converges, at the cost of
+    exceeding it.
+    """
+    groups = _group(parts, budget)
+    while len(groups) > 1:
+        # The groups of one round are independent: summarise them concurrently
+        with ThreadPoolExecutor(max_workers=min(SUMMARY_WORKERS, len(groups))) as pool:
+            summaries = list(pool.map(
+                lambda group: _summarize(kind + " part", name, group, model, theme), groups
+            ))
+        parts = [(f"{name} (part {index + 1})", summary) for index, summary in enumerate(summaries)]
+        groups = _group(parts, budget, min_size=2)
+    return _summarize(kind, name, groups[0], model, theme)
+
+
+def package_of(path: str) -> str:
+    return posixpath.dirname(path) or ROOT_PACKAGE
+
+
+def summarize_hierarchy(results: List[Dict[str, str]], model: str, theme: Optional[str],
+                        workers: int = SUMMARY_WORKERS) -> Dict:
+    """Map-reduce file documentation into package summaries, then a repository overview.
+
+    Packages are the directories holding documented files and are
+    summarised concurrently. A package whose summary fails is left out of
+    the overview rather than failing the job.
+    """
+    by_package = defaultdict(list)
+    for item in results:
+        by_package[package_of(item["path"])].append(
+            (f"`{posixpath.basename(item['path'])}`", item["documentation"])
+        )
+
+    def summarize_package(name: str) -> Optional[str]:
+        try:
+            return reduce_summaries("package", name, sorted(by_package[name]), model, theme)
+        except Exception as e:
+            print(f"Error summarizing package {name}: {e}")
+            return None
+
+    names = sorted(by_package)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(names)))) as pool:
+        packages = {
+            name: summary
+            for name, summary in zip(names, pool.map(summarize_package, names))
+            if summary
+        }
+
+    repository = None
+    if packages:
+        try:
+            repository = reduce_summaries(
+                "repository", "repository",
+                [(f"`{name}`", summary) for name, summary in packages.items()],
+                model, theme
+            )
+        except Exception as e:
+            print(f"Error summarizing repository: {e}")
+
+    return {"repository": repository, "packages": packages}
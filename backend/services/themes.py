@@ -4,7 +4,8 @@ THEMES = {
         "tone": "neutral",
         "detail": "medium",
         "heading_style": "# {title}",
-        "extra_markdown": ""
+        "extra_markdown": "",
+        "llm_render": False  # rendered from extracted facts by template
     },
     "technical": {
         "description": "Engineering-grade documentation.",
@@ -48,4 +49,16 @@ Rules:
 
 Here is the code to document:
 {file_content}
-"""
\ No newline at end of file
+"""
+
+FILE_DELIMITER = "=== FILE: {path} ==="
+
+def build_packed_prompt(files, theme: str):
+    """One prompt for several (path, summary) pairs, answered in delimited sections"""
+    blocks = "\n\n".join(f"{FILE_DELIMITER.format(path=path)}\n{content}" for path, content in files)
+    return build_prompt(blocks, theme) + f"""
+The code above contains {len(files)} separate files. Document each one on its own.
+Start each file's documentation with its delimiter line, copied exactly
+(for example `{FILE_DELIMITER.format(path=files[0][0])}`), in the same order,
+and write nothing before the first delimiter.
+"""
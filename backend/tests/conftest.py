@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Modules under test read their configuration at import time: point every
+# store at a scratch directory before anything from services is imported
+_scratch = tempfile.mkdtemp(prefix="docgen-tests-")
+os.environ.setdefault("DOCGEN_DB", f"sqlite:///{_scratch}/docgen.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_scratch}/auth.db")
+os.environ.setdefault("DOC_STORAGE", f"{_scratch}/generated_docs")
+os.environ.setdefault("LLM_CACHE_DIR", f"{_scratch}/llm_cache")
+os.environ.setdefault("REPO_MIRROR_ROOT", f"{_scratch}/repo_mirrors")
+os.environ.setdefault("OLLAMA_BACKENDS", "http://127.0.0.1:9")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
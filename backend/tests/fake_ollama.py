@@ -0,0 +1,74 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response (cancelled calls) are expected here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeOllama:
+    """A local stand-in for one Ollama host: /api/tags and streaming /api/chat.
+
+    `status` makes every chat call fail with that HTTP status, `delay`
+    holds each response back, and unknown models get Ollama's 404.
+    """
+
+    def __init__(self, models=("llama3.2",), delay: float = 0.0):
+        self.models = set(models)
+        self.delay = delay
+        self.status = None
+        self.requests = 0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                models = [{"name": name} for name in sorted(fake.models)]
+                self._send(200, json.dumps({"models": models}).encode())
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                with fake.lock:
+                    fake.requests += 1
+                time.sleep(fake.delay)
+                if fake.status:
+                    return self._send(fake.status, json.dumps({"error": "backend failure"}).encode())
+                if request["model"] not in fake.models:
+                    error = {"error": f"model '{request['model']}' not found"}
+                    return self._send(404, json.dumps(error).encode())
+                text = f"reply from {fake.name}"
+                lines = [
+                    json.dumps({"message": {"role": "assistant", "content": text}, "done": False}),
+                    json.dumps({"message": {"role": "assistant", "content": ""}, "done": True})
+                ]
+                self._send(200, ("\n".join(lines) + "\n").encode())
+
+        self.server = QuietServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.name = self.url.split("//", 1)[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
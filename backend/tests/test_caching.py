@@ -0,0 +1,39 @@
+from services.caching import (
+    SessionLocal, FileDocCache, save_cached_file_docs, get_cached_file_docs,
+    get_latest_cached_commit, FILE_DOC_CACHE_COMMITS
+)
+
+REPO = "https://example.com/upsert.git"
+
+
+def docs(paths, text="doc"):
+    return [{"path": p, "blob_sha": f"sha-{p}", "documentation": f"{text} {p}"} for p in paths]
+
+
+def test_full_run_fills_in_a_commit_a_filtered_run_started():
+    db = SessionLocal()
+    try:
+        save_cached_file_docs(db, REPO, "main", "c1", None, "m", docs(["pkg/m0.py"]))
+        save_cached_file_docs(db, REPO, "main", "c1", None, "m", docs([f"pkg/m{i}.py" for i in range(4)], "new"))
+        cached = get_cached_file_docs(db, REPO, "main", "c1", None, "m")
+        assert sorted(cached) == [f"pkg/m{i}.py" for i in range(4)]
+        assert cached["pkg/m0.py"]["documentation"] == "new pkg/m0.py"
+        assert db.query(FileDocCache).filter(FileDocCache.repo_url == REPO).count() == 4
+    finally:
+        db.close()
+
+
+def test_only_recent_commits_are_kept():
+    db = SessionLocal()
+    try:
+        commits = [f"p{i}" for i in range(FILE_DOC_CACHE_COMMITS + 2)]
+        for commit in commits:
+            save_cached_file_docs(db, REPO, "prune", commit, "t", "m", docs(["a.py", "b.py"]))
+        kept = {
+            commit for (commit,) in db.query(FileDocCache.commit_hash)
+            .filter(FileDocCache.repo_url == REPO, FileDocCache.branch == "prune")
+        }
+        assert kept == set(commits[-FILE_DOC_CACHE_COMMITS:])
+        assert get_latest_cached_commit(db, REPO, "prune", "t", "m") == commits[-1]
+    finally:
+        db.close()
@@ -0,0 +1,80 @@
+from utils.chunker import chunk_code, estimate_tokens, split_units
+
+PYTHON = '''import os
+import sys
+
+CONSTANT = 1
+
+
+# Comment that belongs to f
+@decorator
+def f(x):
+    return x + 1
+
+
+class A:
+    """Doc."""
+
+    def method(self):
+        return os.getcwd()
+'''
+
+JS = '''const a = require("a");
+
+// helper
+function helper(x) {
+  return x + 1;
+}
+
+export class Thing {
+  run() {
+    return helper(1);
+  }
+}
+'''
+
+
+def test_python_units_keep_comments_and_decorators_with_their_definition():
+    units = split_units(PYTHON, "python")
+    assert len(units) == 3
+    assert units[0].startswith("import os") and "CONSTANT = 1" in units[0]
+    assert units[1].lstrip().startswith("# Comment that belongs to f\n@decorator\ndef f")
+    assert units[2].lstrip().startswith("class A")
+
+
+def test_heuristic_units_split_at_top_level_definitions():
+    units = split_units(JS, "javascript")
+    assert [u.strip().splitlines()[0] for u in units] == [
+        'const a = require("a");', "// helper", "export class Thing {"
+    ]
+
+
+def test_chunks_preserve_every_line_and_respect_the_budget():
+    code = "\n".join(f"def f{i}(x):\n    return x * {i}\n" for i in range(200))
+    chunks = chunk_code(code, language="python", max_tokens=100)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c) <= 100 + 1 for c in chunks)
+    original = [l for l in code.splitlines() if l.strip()]
+    assert [l for c in chunks for l in c.splitlines() if l.strip()] == original
+
+
+def test_definitions_are_not_split_unless_too_big():
+    code = "def small():\n    return 1\n\n" + "def big():\n" + "".join(f"    x{i} = {i}\n" for i in range(200))
+    chunks = chunk_code(code, language="python", max_tokens=200)
+    assert chunks[0].startswith("def small():")
+    assert all("def small" not in c for c in chunks[1:])
+    assert sum(l.startswith("    x") for c in chunks for l in c.splitlines()) == 200
+
+
+def test_overlap_repeats_the_end_of_the_previous_chunk():
+    code = "\n".join(f"def f{i}():\n    return {i}\n" for i in range(50))
+    chunks = chunk_code(code, language="python", max_tokens=60, overlap_tokens=10)
+    plain = chunk_code(code, language="python", max_tokens=60)
+    assert len(chunks) == len(plain)
+    assert chunks[1].endswith(plain[1]) and chunks[1] != plain[1]
+    assert plain[0].splitlines()[-1] in chunks[1].splitlines()
+
+
+def test_max_chars_still_wins():
+    code = "\n".join(f"def f{i}():\n    return {i}\n" for i in range(100))
+    assert chunk_code(code, max_chars=400) == chunk_code(code, max_tokens=100)
@@ -0,0 +1,32 @@
+import httpx
+import pytest
+
+from services.concurrency import AdaptiveLimiter
+
+
+def limiter():
+    return AdaptiveLimiter(initial=8, min_limit=1, max_limit=16)
+
+
+def server_error(status):
+    request = httpx.Request("POST", "http://backend/api/chat")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+
+@pytest.mark.parametrize("error", [server_error(503), httpx.ConnectError("refused")])
+def test_backend_failure_backs_off(error):
+    limit = limiter()
+    with pytest.raises(type(error)):
+        with limit.slot():
+            raise error
+    assert limit.current_limit < 8 and limit.errors == 1 and limit.in_flight == 0
+
+
+@pytest.mark.parametrize("error", [server_error(400), ValueError("unparseable reply"), KeyboardInterrupt()])
+def test_other_errors_release_without_backing_off(error):
+    limit = limiter()
+    with pytest.raises(type(error)):
+        with limit.slot() as sample:
+            sample["tokens"] = 100
+            raise error
+    assert limit.current_limit == 8 and limit.errors == 0 and limit.in_flight == 0
@@ -0,0 +1,126 @@
+import json
+import uuid
+
+from cryptography.fernet import Fernet
+from fastapi.testclient import TestClient
+
+from services.caching import SessionLocal
+from services.job_queue import (
+    Job, JobFlight, enqueue, claim_next, get_job, update_job, finish_job, join_flight,
+    COMPLETED, FAILED, FOLLOWING
+)
+
+
+def flight():
+    return uuid.uuid4().hex
+
+
+def state(job_id):
+    db = SessionLocal()
+    try:
+        return db.get(Job, job_id).state
+    finally:
+        db.close()
+
+
+def test_identical_job_follows_the_leader():
+    key = flight()
+    leader, follower = enqueue({"repo_url": "a"}), enqueue({"repo_url": "a"})
+    assert join_flight(leader, key) is None
+    assert join_flight(follower, key) == leader
+    assert join_flight(leader, key) is None  # a requeued leader resumes its own flight
+    assert state(follower) == FOLLOWING
+
+    update_job(leader, status="Processing files", progress=30)
+    followed = get_job(follower)
+    assert followed["following"] == leader
+    assert (followed["status"], followed["progress"]) == ("Processing files", 30)
+
+
+def test_finishing_the_leader_completes_followers_with_its_results(tmp_path):
+    key = flight()
+    leader = enqueue({"repo_url": "b"}, details={"format": "md"})
+    follower = enqueue({"repo_url": "b"}, details={"format": "md"})
+    join_flight(leader, key)
+    join_flight(follower, key)
+
+    outputs = {"default": str(tmp_path / "default.md"), "research": str(tmp_path / "research.md")}
+    update_job(leader, output_files=outputs, files_done=3)
+    finish_job(leader, "Completed", output_file=outputs["default"])
+
+    job = get_job(follower)
+    assert state(follower) == COMPLETED
+    assert "following" not in job
+    assert (job["status"], job["progress"], job["output_file"]) == ("Completed", 100, outputs["default"])
+    assert job["output_files"] == outputs and job["files_done"] == 3 and job["format"] == "md"
+
+    # The flight is released: the next identical request leads again
+    assert join_flight(enqueue({"repo_url": "b"}), key) is None
+
+
+def test_follower_downloads_a_theme_of_the_leaders_output(tmp_path):
+    from main import app
+
+    key = flight()
+    leader, follower = enqueue({"repo_url": "c"}), enqueue({"repo_url": "c"})
+    join_flight(leader, key)
+    join_flight(follower, key)
+    research = tmp_path / "research.md"
+    research.write_text("# research")
+    update_job(leader, output_files={"default": str(research), "research": str(research)})
+    finish_job(leader, "Completed", output_file=str(research))
+
+    client = TestClient(app)  # no lifespan: job workers stay off
+    for job_id in (leader, follower):
+        response = client.get(f"/download/{job_id}", params={"theme": "research"})
+        assert response.status_code == 200 and response.text == "# research"
+
+
+def test_failure_fails_followers_and_releases_the_flight():
+    key = flight()
+    leader, follower = enqueue({"repo_url": "d"}), enqueue({"repo_url": "d"})
+    join_flight(leader, key)
+    join_flight(follower, key)
+    finish_job(leader, "Failed", error="clone failed")
+
+    job = get_job(follower)
+    assert state(follower) == FAILED and job["error"] == "clone failed"
+    db = SessionLocal()
+    try:
+        assert db.get(JobFlight, key) is None
+    finally:
+        db.close()
+
+
+def test_flight_of_a_dead_leader_is_taken_over():
+    key = flight()
+    crashed, retry = enqueue({"repo_url": "e"}), enqueue({"repo_url": "e"})
+    join_flight(crashed, key)
+    db = SessionLocal()
+    try:
+        # Finished without releasing its flight, e.g. the process died mid-commit
+        db.query(Job).filter(Job.id == crashed).update({Job.state: FAILED})
+        db.commit()
+    finally:
+        db.close()
+    assert join_flight(retry, key) is None
+    assert state(retry) != FOLLOWING
+
+
+def test_job_with_undecryptable_token_fails_instead_of_running():
+    stale = enqueue({"repo_url": "f", "access_token": "secret"}, priority=1000)
+    db = SessionLocal()
+    try:
+        # As if ENCRYPTION_KEY changed between enqueue and claim
+        job = db.get(Job, stale)
+        request = json.loads(job.request)
+        request["access_token"] = Fernet(Fernet.generate_key()).encrypt(b"secret").decode()
+        job.request = json.dumps(request)
+        db.commit()
+    finally:
+        db.close()
+    fresh = enqueue({"repo_url": "f", "access_token": "secret"}, priority=999)
+
+    assert claim_next("test-worker") == (fresh, {"repo_url": "f", "access_token": "secret"})
+    job = get_job(stale)
+    assert state(stale) == FAILED and "decrypt" in job["error"]
@@ -0,0 +1,79 @@
+import threading
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services.job_queue import enqueue, update_job, finish_job, join_flight
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)  # no lifespan: job workers stay off
+
+
+def later(seconds, func, *args, **kwargs):
+    timer = threading.Timer(seconds, func, args, kwargs)
+    timer.start()
+    return timer
+
+
+def test_status_without_version_returns_at_once(client):
+    job_id = enqueue({"repo_url": "s"})
+    response = client.get(f"/status/{job_id}", params={"wait": 10})
+    assert response.status_code == 200 and response.json()["state"] == "queued"
+    assert client.get(f"/status/{uuid.uuid4()}").status_code == 404
+
+
+def test_long_poll_returns_when_the_job_changes(client):
+    job_id = enqueue({"repo_url": "s"})
+    version = client.get(f"/status/{job_id}").json()["version"]
+    later(0.3, update_job, job_id, status="Processing files", progress=30)
+
+    started = time.monotonic()
+    job = client.get(f"/status/{job_id}", params={"version": version, "wait": 10}).json()
+    assert 0.2 < time.monotonic() - started < 5
+    assert job["version"] != version and job["progress"] == 30
+
+
+def test_long_poll_times_out_unchanged(client):
+    job_id = enqueue({"repo_url": "s"})
+    version = client.get(f"/status/{job_id}").json()["version"]
+    started = time.monotonic()
+    job = client.get(f"/status/{job_id}", params={"version": version, "wait": 0.3}).json()
+    assert time.monotonic() - started >= 0.3 and job["version"] == version
+
+
+def test_long_poll_on_a_follower_wakes_on_the_leader(client):
+    key = uuid.uuid4().hex
+    leader, follower = enqueue({"repo_url": "s"}), enqueue({"repo_url": "s"})
+    join_flight(leader, key)
+    join_flight(follower, key)
+    version = client.get(f"/status/{follower}").json()["version"]
+    later(0.3, update_job, leader, progress=55)
+
+    job = client.get(f"/status/{follower}", params={"version": version, "wait": 10}).json()
+    assert job["progress"] == 55 and job["following"] == leader
+
+
+def test_websocket_pushes_each_change_until_the_job_finishes(client):
+    job_id = enqueue({"repo_url": "s"})
+    missing = str(uuid.uuid4())
+    with client.websocket_connect("/ws/status") as socket:
+        socket.send_json({"subscribe": [job_id, missing]})
+        first = {message["job_id"]: message for message in (socket.receive_json(), socket.receive_json())}
+        assert first[job_id]["state"] == "queued"
+        assert first[missing]["error"] == "Invalid Job Id"
+
+        later(0.1, update_job, job_id, status="Processing files", progress=40)
+        assert socket.receive_json()["progress"] == 40
+
+        later(0.1, finish_job, job_id, "Completed", output_file="/tmp/out.md")
+        final = socket.receive_json()
+        assert (final["job_id"], final["state"], final["progress"]) == (job_id, "completed", 100)
+
+        socket.send_json(["not", "an", "object"])
+        socket.send_text("not json")
+        assert socket.receive_json() == {"error": "Expected a JSON object"}
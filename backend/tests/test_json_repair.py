@@ -0,0 +1,43 @@
+import pytest
+
+from utils.json_repair import JSONExtractor, extract_json
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1, "b": [1, 2]}', {"a": 1, "b": [1, 2]}),
+    ('Sure! ```json\n{"a": 1}\n``` Hope this helps [1]', {"a": 1}),
+    ('Here [see below]: {"a":1}', {"a": 1}),
+    ('Notes {draft} and [todo]\n[1, 2]', [1, 2]),
+    ('{"k": "a}b [x]", "l": []}', {"k": "a}b [x]", "l": []}),
+    ('{"a": [true, false, null, -1.5e3]}', {"a": [True, False, None, -1500.0]}),
+])
+def test_complete_values(text, expected):
+    assert extract_json(text) == (expected, False)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"overview": "hello wor', {"overview": "hello wor"}),
+    ('{"a": [1, 2, {"x": "y"', {"a": [1, 2, {"x": "y"}]}),
+    ('{"a": 1, "b": tru', {"a": 1}),
+    ('{"a": 1, "b":', {"a": 1}),
+    ('{"a": "x\\', {"a": "x"}),
+    ('{"k": "a}b", "l": [', {"k": "a}b", "l": []}),
+    ('[1,2', [1, 2]),
+    ('Here [see below]: {"a": "trunc', {"a": "trunc"}),
+])
+def test_truncated_values_are_repaired(text, expected):
+    assert extract_json(text) == (expected, True)
+
+
+@pytest.mark.parametrize("text", ["no json here", "[see below]", "{not: json}", ""])
+def test_no_value(text):
+    assert extract_json(text) == (None, False)
+
+
+def test_incremental_feed_completes_when_the_value_closes():
+    extractor = JSONExtractor()
+    for piece, complete in (('I think [maybe] ', False), ('{"a"', False), (': [1', False), (', 2]}', True)):
+        extractor.feed(piece)
+        assert extractor.complete is complete
+    extractor.feed(' trailing {"b": 2}')
+    assert extractor.result() == ({"a": [1, 2]}, False)
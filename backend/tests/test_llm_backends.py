@@ -0,0 +1,107 @@
+import asyncio
+import itertools
+import threading
+import time
+import uuid
+
+import httpx
+import pytest
+
+from fake_ollama import FakeOllama
+from services.llm_backends import BackendPool, NoBackendAvailable, BREAKER_FAILURES
+from services.llm_engine import LLMEngine
+
+
+@pytest.fixture
+def fakes():
+    with FakeOllama(delay=0.05) as a, FakeOllama(delay=0.05) as b:
+        yield a, b
+
+
+@pytest.fixture
+def engine(fakes):
+    pool = BackendPool([fake.url for fake in fakes])
+    return LLMEngine(pool, max_concurrency=8, timeout=10, connect_timeout=2)
+
+
+_prompts = itertools.count()
+
+
+def chat(engine, model="llama3.2"):
+    # A fresh prompt every call, so nothing is answered from the response cache
+    return engine.chat_sync(model, "system", f"prompt {next(_prompts)} {uuid.uuid4()}")
+
+
+def test_routes_concurrent_calls_to_least_loaded_backend(engine, fakes):
+    threads = [threading.Thread(target=chat, args=(engine,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [fake.requests for fake in fakes] == [4, 4]
+    assert all(b["outstanding"] == 0 for b in engine.pool.stats())
+
+
+def test_fails_over_and_opens_breaker_on_server_errors(engine, fakes):
+    broken, working = fakes
+    broken.status = 500
+    for _ in range(BREAKER_FAILURES + 2):
+        assert chat(engine) == f"reply from {working.name}"
+    assert engine.pool.get(broken.name).breaker == "open"
+    # While open, the broken backend isn't tried at all
+    assert broken.requests == BREAKER_FAILURES
+
+
+def test_client_errors_do_not_trip_breakers(engine, fakes):
+    for _ in range(BREAKER_FAILURES + 1):
+        with pytest.raises(httpx.HTTPStatusError):
+            chat(engine, model="nope")
+    # No failover either: a 4xx is tried on one backend only
+    assert sum(fake.requests for fake in fakes) == BREAKER_FAILURES + 1
+    assert all(b["breaker"] == "closed" and b["errors"] == 0 for b in engine.pool.stats())
+    assert chat(engine).startswith("reply from")
+
+
+def test_all_backends_down(engine, fakes):
+    for fake in fakes:
+        fake.status = 503
+    for _ in range(BREAKER_FAILURES):
+        with pytest.raises(httpx.HTTPStatusError):
+            chat(engine)
+    with pytest.raises(NoBackendAvailable):
+        chat(engine)
+
+
+def test_drained_backend_gets_no_new_requests(engine, fakes):
+    drained, active = fakes
+    engine.pool.drain(drained.name)
+    for _ in range(4):
+        assert chat(engine) == f"reply from {active.name}"
+    assert drained.requests == 0
+
+    engine.pool.drain(drained.name, draining=False)
+    threads = [threading.Thread(target=chat, args=(engine,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert drained.requests == 1
+
+
+def test_cancelled_call_releases_its_backend(engine, fakes):
+    for fake in fakes:
+        fake.delay = 0.5
+
+    async def cancel_in_flight():
+        task = asyncio.ensure_future(engine.chat("llama3.2", "system", f"slow {uuid.uuid4()}"))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_in_flight())
+    deadline = time.monotonic() + 2
+    while any(b["outstanding"] for b in engine.pool.stats()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    stats = engine.pool.stats()
+    assert all(b["outstanding"] == 0 and b["breaker"] == "closed" for b in stats)
@@ -0,0 +1,27 @@
+from services.llm_cache import LLMResponseCache, cache_key
+
+
+def test_entries_written_by_another_process_are_hits(tmp_path):
+    writer = LLMResponseCache(tmp_path, max_bytes=1_000_000)
+    reader = LLMResponseCache(tmp_path, max_bytes=1_000_000)
+    key = cache_key("m", "system", "user")
+    writer.put(key, "answer")
+    assert reader.get(key) == "answer"
+    assert reader.stats()["entries"] == 1
+
+
+def test_size_budget_is_shared_after_a_rescan(tmp_path):
+    first = LLMResponseCache(tmp_path, max_bytes=100, rescan_seconds=0)
+    second = LLMResponseCache(tmp_path, max_bytes=100, rescan_seconds=0)
+    for i in range(3):
+        first.put(cache_key("m", "s", f"a{i}"), "x" * 30)
+    for i in range(3):
+        second.put(cache_key("m", "s", f"b{i}"), "x" * 30)
+    on_disk = sum(p.stat().st_size for p in tmp_path.glob("*/*.txt"))
+    assert on_disk <= 100
+
+
+def test_missing_key_is_a_miss(tmp_path):
+    cache = LLMResponseCache(tmp_path, max_bytes=1000)
+    assert cache.get(cache_key("m", "s", "nothing")) is None
+    assert cache.stats()["misses"] == 1
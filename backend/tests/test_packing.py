@@ -0,0 +1,30 @@
+from services.doc_gen import FileInfo, pack_files, split_packed_response
+
+
+def test_split_packed_response_by_delimiter():
+    text = (
+        "Here you go.\n"
+        "=== FILE: a.py ===\nDoc for a.\nMore a.\n"
+        "**=== FILE: b.py ===**\nDoc for b.\n"
+        "### === FILE: unknown.py ===\nIgnored.\n"
+        "=== FILE: c.py ===\n\n"
+    )
+    assert split_packed_response(text, ["a.py", "b.py", "c.py"]) == {
+        "a.py": "Doc for a.\nMore a.",
+        "b.py": "Doc for b."
+    }
+
+
+def test_split_packed_response_without_delimiters():
+    assert split_packed_response("Just prose.", ["a.py"]) == {}
+
+
+def test_pack_files_groups_small_files_under_the_budget():
+    files = [FileInfo(path=f"f{i}.py", content="x" * 40, size=40) for i in range(10)]
+    big = FileInfo(path="big.py", content="x" * 4000, size=4000)
+    groups = pack_files(files + [big], budget=100)
+    assert [big] in groups
+    small_groups = [g for g in groups if g != [big]]
+    assert sorted(f.path for g in small_groups for f in g) == sorted(f.path for f in files)
+    # 27 estimated tokens each (content + delimiter line): three to a 100-token prompt
+    assert [len(g) for g in small_groups] == [3, 3, 3, 1]
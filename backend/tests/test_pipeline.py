@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+import services.doc_gen as doc_gen
+from services.doc_gen import SourceFile, process_sources
+from services.pipeline import Pipeline
+
+
+def test_items_flow_through_every_stage():
+    pipeline = Pipeline(queue_size=4)
+    pipeline.add_stage("double", lambda n: [n * 2], 3)
+    pipeline.add_stage("keep_small", lambda n: [n] if n < 10 else [], 2)
+    assert sorted(pipeline.run(range(10))) == [0, 2, 4, 6, 8]
+    assert pipeline.stats["processed"] == {"double": 10, "keep_small": 10}
+
+
+def test_batched_stage_sees_every_item_once():
+    pipeline = Pipeline(queue_size=8)
+    pipeline.add_stage("batch", lambda batch: [sum(batch)], 2, batch_size=5)
+    assert sum(pipeline.run(range(100))) == sum(range(100))
+    assert pipeline.stats["processed"]["batch"] == 100
+
+
+def test_slow_stage_holds_back_the_source():
+    produced = []
+    release = threading.Event()
+
+    def source():
+        for n in range(1000):
+            produced.append(n)
+            yield n
+
+    def slow(n):
+        release.wait()
+        return [n]
+
+    pipeline = Pipeline(queue_size=2)
+    pipeline.add_stage("slow", slow, 1)
+    results = pipeline.run(source())
+    reader = threading.Thread(target=lambda: results.__next__())
+    reader.start()
+    time.sleep(0.3)
+    # One item in the worker, two queued, one blocked on the full queue
+    assert len(produced) <= 4
+    release.set()
+    reader.join()
+    results.close()
+
+
+def test_source_error_is_raised_to_the_consumer():
+    def source():
+        yield 1
+        raise OSError("git pipe broke")
+
+    pipeline = Pipeline()
+    pipeline.add_stage("pass", lambda n: [n], 1)
+    with pytest.raises(OSError, match="git pipe broke"):
+        list(pipeline.run(source()))
+
+
+def test_failing_item_is_dropped_without_stopping_the_stage():
+    def fail_on_three(n):
+        if n == 3:
+            raise ValueError("bad file")
+        return [n]
+
+    pipeline = Pipeline()
+    pipeline.add_stage("flaky", fail_on_three, 2)
+    assert sorted(pipeline.run(range(6))) == [0, 1, 2, 4, 5]
+
+
+def test_early_exit_closes_the_source():
+    closed = threading.Event()
+
+    def source():
+        try:
+            for n in range(1000):
+                yield n
+        finally:
+            closed.set()
+
+    pipeline = Pipeline(queue_size=2)
+    pipeline.add_stage("pass", lambda n: [n], 1)
+    for _ in pipeline.run(source()):
+        break
+    assert closed.is_set()
+
+
+def python_sources(count, closed):
+    try:
+        for n in range(count):
+            yield SourceFile(path=f"pkg/m{n}.py", data=f"def f{n}(x):\n    return x\n".encode())
+    finally:
+        closed.set()
+
+
+@pytest.mark.parametrize("count, engine", [(3, "thread"), (6, "process")])
+def test_auto_engine_picks_by_size_and_documents_every_file(monkeypatch, count, engine):
+    monkeypatch.setattr(doc_gen, "PROCESS_POOL_MIN_FILES", 5)
+    closed, stats = threading.Event(), {}
+    results = process_sources(python_sources(count, closed), "llama3.2", 2, "default",
+                              stats=stats, mode="reference")
+    assert stats["analysis_engine"] == engine
+    assert sorted(item["path"] for item in results) == [f"pkg/m{n}.py" for n in range(count)]
+    assert closed.is_set()
+
+
+def test_auto_engine_closes_the_source_on_early_exit(monkeypatch):
+    monkeypatch.setattr(doc_gen, "PROCESS_POOL_MIN_FILES", 5)
+    closed = threading.Event()
+
+    def stop(_):
+        raise RuntimeError("job cancelled")
+
+    with pytest.raises(RuntimeError) as caught:
+        process_sources(python_sources(1000, closed), "llama3.2", 2, "default",
+                        queue_size=2, on_result=stop, mode="reference")
+    # Closed by process_sources itself, not by garbage collection of its frame
+    assert closed.is_set() and caught.traceback
@@ -0,0 +1,15 @@
+import services.summaries as summaries
+
+
+def test_budget_below_one_summary_still_converges(monkeypatch):
+    calls = []
+
+    def summarize(kind, name, parts, model, theme):
+        calls.append(len(parts))
+        return "word " * 300  # a full-length summary, far over the budget
+
+    monkeypatch.setattr(summaries, "_summarize", summarize)
+    parts = [(f"`m{n}.py`", "doc " * 400) for n in range(8)]
+    assert summaries.reduce_summaries("package", "pkg", parts, "llama3.2", None, budget=50)
+    # 8 single-part groups, then pairs: 4, 2, and the final prompt
+    assert calls == [1] * 8 + [2] * 4 + [2] * 2 + [2]
@@ -0,0 +1,56 @@
+from collections import Counter
+
+from utils.filters import PathFilter
+from utils.walker import walk_files
+
+
+def make_tree(root, paths):
+    for path in paths:
+        target = root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text("x = 1\n")
+
+
+def walked(root, path_filter=None, stats=None):
+    return sorted(rel for rel, _ in walk_files(root, path_filter, stats))
+
+
+def test_skip_rules_prune_directories_and_files(tmp_path):
+    make_tree(tmp_path, [
+        "app/main.py", "app/util.py", "app/__init__.py", "app/_private.py",
+        "app/test_main.py", "app/notes.txt", "venv/lib/site.py",
+        "node_modules/pkg/index.py", "app/__pycache__/main.py"
+    ])
+    stats = Counter()
+    assert walked(tmp_path, stats=stats) == ["app/main.py", "app/util.py"]
+    assert stats == Counter({"dir": 3, "file": 1, "prefix": 2, "extension": 1})
+
+
+def test_exclude_prunes_matching_directories_and_files(tmp_path):
+    make_tree(tmp_path, ["src/core.py", "src/gen/models.py", "docs/conf.py", "src/core_pb2.py"])
+    stats = Counter()
+    path_filter = PathFilter(exclude=["gen/", "/docs", "*_pb2.py"])
+    assert walked(tmp_path, path_filter, stats) == ["src/core.py"]
+    # Directories are pruned once, their files never visited
+    assert stats["exclude"] == 3
+
+
+def test_include_keeps_only_matching_files(tmp_path):
+    make_tree(tmp_path, ["src/api/views.py", "src/api/deep/models.py", "src/cli.py", "scripts/run.py"])
+    path_filter = PathFilter(include=["src/api/**"])
+    assert walked(tmp_path, path_filter) == ["src/api/deep/models.py", "src/api/views.py"]
+    assert walked(tmp_path, PathFilter(include=["cli.py", "/scripts/*.py"])) == ["scripts/run.py", "src/cli.py"]
+
+
+def test_exclude_wins_over_include(tmp_path):
+    make_tree(tmp_path, ["src/a.py", "src/legacy/b.py"])
+    path_filter = PathFilter(include=["src/**"], exclude=["legacy/"])
+    assert walked(tmp_path, path_filter) == ["src/a.py"]
+
+
+def test_path_reason_matches_the_walker(tmp_path):
+    paths = ["src/a.py", "src/gen/b.py", "venv/c.py", "src/_d.py", "lib/e.py"]
+    make_tree(tmp_path, paths)
+    path_filter = PathFilter(include=["src/**", "lib/e.py"], exclude=["gen/"])
+    kept = [path for path in paths if path_filter.path_reason(path) is None]
+    assert sorted(kept) == walked(tmp_path, path_filter)
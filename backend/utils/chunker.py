@@ -1,20 +1,146 @@
-def chunk_code(code: str, max_chars: int = 6000):
-    lines = code.splitlines()
-    chunks = []
-    current_chunk = []
+import os
+import re
+import ast
+from typing import List, Optional
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Prompt budget for one chunk of source, and context repeated from the previous chunk
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", "1500"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "0"))
+
+# Start of a top-level definition in the brace/indent languages detect_language knows
+_DEFINITION = re.compile(
+    r"^(export\s+|public\s+|private\s+|protected\s+|internal\s+|static\s+|abstract\s+|async\s+|default\s+)*"
+    r"(function|class|interface|enum|struct|type|func|def|namespace|const|let|var|[\w<>\[\],:*&\s]+\()"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1  # ~4 characters per token for code and English
+
+
+# ============================================================================
+# TOP-LEVEL UNITS
+# ============================================================================
+
+def _python_units(lines: List[str], code: str) -> Optional[List[List[str]]]:
+    """Lines of each top-level statement; comments directly above one stay with it"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    starts, previous_end = [], 0
+    for node in tree.body:
+        first = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])]) - 1
+        while first > previous_end and lines[first - 1].lstrip().startswith("#"):
+            first -= 1
+        starts.append(first)
+        previous_end = node.end_lineno
+    if not starts:
+        return [lines]
+    starts[0] = 0
+    # Merge runs of small statements (imports, constants) into one unit
+    bounds = []
+    for index, start in enumerate(starts):
+        node = tree.body[index]
+        small = not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        if bounds and small and bounds[-1][1]:
+            continue
+        bounds.append((start, small))
+    return [
+        lines[start:bounds[i + 1][0] if i + 1 < len(bounds) else len(lines)]
+        for i, (start, _) in enumerate(bounds)
+    ]
 
-    current_size = 0
 
+def _heuristic_units(lines: List[str]) -> List[List[str]]:
+    """Split where an unindented definition starts outside any braces"""
+    units, current, depth = [], [], 0
     for line in lines:
-        current_chunk.append(line)
-        current_size += len(line)
+        stripped = line.strip()
+        at_top = depth <= 0 and line[:1] not in (" ", "\t", "}", ")")
+        if at_top and current and _DEFINITION.match(stripped) and stripped.rstrip().endswith(("{", ":", "(", ")")):
+            # Keep the comment/doc block right above a definition with it
+            head = len(current)
+            while head and (not current[head - 1].strip() or current[head - 1].lstrip().startswith(("//", "#", "*", "/*"))):
+                head -= 1
+            if head:
+                units.append(current[:head])
+                current = current[head:]
+        current.append(line)
+        depth += line.count("{") - line.count("}")
+    if current:
+        units.append(current)
+    return units
+
+
+def split_units(code: str, language: Optional[str] = None) -> List[str]:
+    """Source split at top-level definitions: ast for Python, a brace heuristic otherwise"""
+    lines = code.splitlines()
+    units = _python_units(lines, code) if language in (None, "python") else None
+    if units is None:
+        units = _heuristic_units(lines)
+    return ["\n".join(unit) for unit in units if any(l.strip() for l in unit)]
+
+
+def _split_lines(unit: str, max_tokens: int) -> List[str]:
+    """Last resort for one definition bigger than the budget: cut between lines"""
+    parts, current, used = [], [], 0
+    for line in unit.splitlines():
+        tokens = estimate_tokens(line + "\n")
+        if current and used + tokens > max_tokens:
+            parts.append("\n".join(current))
+            current, used = [], 0
+        current.append(line)
+        used += tokens
+    if current:
+        parts.append("\n".join(current))
+    return parts
+
+
+# ============================================================================
+# CHUNKING
+# ============================================================================
+
+def chunk_code(code: str, max_chars: Optional[int] = None, language: Optional[str] = None,
+               max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Pack whole top-level definitions greedily into chunks of at most `max_tokens`.
+
+    Only a single definition larger than the budget is split, between
+    lines. With `overlap_tokens`, each chunk starts with the last lines of
+    the previous one for context. `max_chars` is the old character budget
+    and still wins when given.
+    """
+    if max_chars is not None:
+        max_tokens = max(1, max_chars // 4)
 
-        if current_size >= max_chars:
-            chunks.append("\n".join(current_chunk))
-            current_chunk = []
-            current_size = 0
+    chunks, current, used = [], [], 0
+    for unit in split_units(code, language):
+        tokens = estimate_tokens(unit + "\n")
+        pieces = [unit] if tokens <= max_tokens else _split_lines(unit, max_tokens)
+        for piece in pieces:
+            tokens = estimate_tokens(piece + "\n")
+            if current and used + tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, used = [], 0
+            current.append(piece)
+            used += tokens
+    if current:
+        chunks.append("\n".join(current))
 
-    if current_chunk:
-        chunks.append("\n".join(current_chunk))
+    if overlap_tokens and len(chunks) > 1:
+        overlapped = [chunks[0]]
+        for previous, chunk in zip(chunks, chunks[1:]):
+            tail, used = [], 0
+            for line in reversed(previous.splitlines()):
+                used += estimate_tokens(line + "\n")
+                if used > overlap_tokens:
+                    break
+                tail.insert(0, line)
+            overlapped.append("\n".join(tail + [chunk]) if tail else chunk)
+        chunks = overlapped
 
     return chunks
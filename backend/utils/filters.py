@@ -0,0 +1,110 @@
+import re
+from typing import Optional
+
+SKIP_PATTERNS = {
+    "dirs": {
+        ".git", ".github", ".gitlab", ".vscode", ".idea", "__pycache__",
+        "node_modules", ".pytest_cache", ".mypy_cache", ".tox", "dist",
+        "build", "venv", ".venv", "env", "site-packages", "vendor",
+        ".eggs", "htmlcov", "migrations"
+    },
+    "files": {"__init__.py", "setup.py", "conftest.py"},
+    "prefixes": ("test_", ".", "_"),
+    "suffixes": (".pyc", ".pyo", ".pyd", ".so", ".dll")
+}
+
+TARGET_EXTENSIONS = (".py",)
+
+
+def sparse_checkout_patterns(extensions=TARGET_EXTENSIONS) -> list[str]:
+    """Non-cone sparse-checkout patterns that materialise only what analysis keeps.
+
+    Mirrors SKIP_PATTERNS: include the target extensions anywhere, then drop
+    skipped directories, skipped file names and skipped name prefixes.
+    """
+    patterns = [f"*{ext}" for ext in extensions]
+    patterns += [f"!**/{d}/**" for d in sorted(SKIP_PATTERNS["dirs"])]
+    patterns += [f"!{name}" for name in sorted(SKIP_PATTERNS["files"])]
+    # Prefix rules apply to file names only, so anchor them on the extension
+    # (a bare "!_*" would also hide directories such as "_internal/")
+    patterns += [f"!{prefix}*{ext}" for prefix in SKIP_PATTERNS["prefixes"] for ext in extensions]
+    return patterns
+
+
+def compile_glob(pattern: str) -> "re.Pattern":
+    """Compile a gitignore-style glob into a regex over repo-relative paths.
+
+    Patterns without a slash match at any depth, a leading slash anchors to
+    the repo root, a trailing slash only matches directories, and `**`
+    spans directories. A pattern that matches a directory also matches
+    everything below it. Directories are tested with a trailing slash.
+    """
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+
+    prefix = "" if anchored else "(?:.*/)?"
+    suffix = "/.*" if dir_only else "(?:/.*)?"
+    return re.compile(f"^{prefix}{regex}{suffix}$")
+
+
+class PathFilter:
+    """Decides which repo paths reach analysis, and names the rule that rejected the rest"""
+
+    def __init__(self, extensions=TARGET_EXTENSIONS, include=(), exclude=()):
+        self.extensions = tuple(extensions)
+        self.include = [compile_glob(p) for p in include]
+        self.exclude = [compile_glob(p) for p in exclude]
+
+    def dir_reason(self, rel_dir: str) -> Optional[str]:
+        """Why a directory should be pruned, or None to descend into it"""
+        if rel_dir.rsplit("/", 1)[-1] in SKIP_PATTERNS["dirs"]:
+            return "dir"
+        if any(rx.match(rel_dir + "/") for rx in self.exclude):
+            return "exclude"
+        return None
+
+    def file_reason(self, rel_path: str) -> Optional[str]:
+        """Why a file in a kept directory should be skipped, or None to keep it"""
+        name = rel_path.rsplit("/", 1)[-1]
+        if not name.endswith(self.extensions):
+            return "extension"
+        if name in SKIP_PATTERNS["files"]:
+            return "file"
+        if name.startswith(SKIP_PATTERNS["prefixes"]):
+            return "prefix"
+        if name.endswith(SKIP_PATTERNS["suffixes"]):
+            return "suffix"
+        if any(rx.match(rel_path) for rx in self.exclude):
+            return "exclude"
+        if self.include and not any(rx.match(rel_path) for rx in self.include):
+            return "include"
+        return None
+
+    def path_reason(self, rel_path: str) -> Optional[str]:
+        """Same decision for a full path, for listings that are not walked"""
+        parts = rel_path.split("/")
+        for depth in range(1, len(parts)):
+            if reason := self.dir_reason("/".join(parts[:depth])):
+                return reason
+        return self.file_reason(rel_path)
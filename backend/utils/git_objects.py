@@ -0,0 +1,106 @@
+import hashlib
+import subprocess
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+
+def git_blob_sha(data: bytes) -> str:
+    """Same id `git hash-object` gives the file, so unchanged files match across commits"""
+    header = f"blob {len(data)}\0".encode()
+    return hashlib.sha1(header + data).hexdigest()
+
+
+@dataclass
+class TreeEntry:
+    """A blob in a commit's tree"""
+    path: str
+    blob_sha: str
+    size: int
+
+
+def list_tree(git_dir: Path, commit: str, keep: Optional[Callable[[str, int], bool]] = None) -> list[TreeEntry]:
+    """List every blob reachable from `commit` without checking anything out"""
+    result = subprocess.run(
+        ["git", "ls-tree", "-r", "-l", "-z", "--full-tree", commit],
+        cwd=git_dir,
+        capture_output=True
+    )
+    if result.returncode != 0:
+        raise Exception(result.stderr.decode(errors="ignore").strip())
+
+    entries = []
+    for record in result.stdout.split(b"\0"):
+        if not record:
+            continue
+        # <mode> SP <type> SP <sha> SP+ <size> TAB <path>
+        meta, path = record.split(b"\t", 1)
+        _, obj_type, sha, size = meta.split()
+        if obj_type != b"blob":
+            continue  # submodules show up as commits
+        path = path.decode("utf-8", errors="surrogateescape")
+        size = int(size)
+        if keep is None or keep(path, size):
+            entries.append(TreeEntry(path=path, blob_sha=sha.decode(), size=size))
+    return entries
+
+
+def iter_blobs(git_dir: Path, entries: Iterable[TreeEntry]) -> Iterator[tuple[TreeEntry, bytes]]:
+    """Stream blob contents from the object store through one `git cat-file --batch`"""
+    entries = list(entries)
+    if not entries:
+        return
+
+    proc = subprocess.Popen(
+        ["git", "cat-file", "--batch"],
+        cwd=git_dir,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+
+    def feed():
+        # Separate writer so a full stdout pipe can never deadlock us
+        try:
+            for entry in entries:
+                proc.stdin.write(f"{entry.blob_sha}\n".encode())
+            proc.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    try:
+        for entry in entries:
+            header = proc.stdout.readline().split()
+            if len(header) < 3:  # "<sha> missing"
+                continue
+            data = proc.stdout.read(int(header[2]))
+            proc.stdout.read(1)  # trailing newline
+            yield entry, data
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+        writer.join()
+
+
+def _git(*args: str, cwd: Optional[str] = None, stdin: Optional[str] = None) -> str:
+    result = subprocess.run(["git", *args], cwd=cwd, input=stdin, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip())
+    return result.stdout
+
+
+def partial_clone(url: str, branch: str, dest: str, sparse_patterns: list[str]):
+    """Blob-less, sparse clone of one branch.
+
+    Only commits and trees are transferred up front; blobs are fetched on
+    demand at checkout, and only for paths matching `sparse_patterns`
+    (gitignore syntax).
+    """
+    _git("clone", "--quiet", "--filter=blob:none", "--no-checkout", "--depth=1",
+         "--single-branch", "--branch", branch, "-c", "core.autocrlf=false", url, dest)
+    _git("sparse-checkout", "set", "--no-cone", "--stdin", cwd=dest, stdin="\n".join(sparse_patterns))
+    _git("checkout", "--quiet", branch, cwd=dest)
@@ -0,0 +1,131 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+# ============================================================================
+# TOLERANT JSON EXTRACTION
+# ============================================================================
+
+_CLOSERS = {"{": "}", "[": "]"}
+# Outside strings, JSON is only structure, numbers and true/false/null
+_LITERAL_CHARS = set("0123456789+-.eEtrufalsn")
+_STRUCTURE_CHARS = set("{}[],: \t\r\n")
+
+_UNSET = object()
+
+
+class JSONExtractor:
+    """Finds the first JSON object or array in model output, fed piece by piece.
+
+    A candidate starts at an opening bracket. It is abandoned as soon as it
+    contains something JSON can't (prose in brackets, say), or when it
+    closes but doesn't parse. Scanning then resumes at the next opening
+    bracket. Text after the value is ignored. `complete` is true as soon as
+    a value closes and parses. If the output was cut off, `result()` closes
+    the open string and brackets. It falls back to the last complete
+    element when the tail is unusable.
+    """
+
+    def __init__(self):
+        self.value: Any = _UNSET
+        self._reset()
+
+    def _reset(self):
+        self.chars: List[str] = []
+        self.stack: List[str] = []
+        self.in_string = False
+        self.escaped = False
+        # (length, open brackets) at each point where the value can be cut cleanly
+        self.checkpoints: List[Tuple[int, List[str]]] = []
+
+    @property
+    def complete(self) -> bool:
+        return self.value is not _UNSET
+
+    @property
+    def started(self) -> bool:
+        return bool(self.chars)
+
+    def feed(self, text: str):
+        pending = text
+        while pending and not self.complete:
+            pending = self._scan(pending)
+
+    def _scan(self, text: str) -> str:
+        """Consume `text`; returns what still has to be scanned after abandoning a candidate"""
+        for index, char in enumerate(text):
+            if not self.chars and char not in _CLOSERS:
+                continue
+            self.chars.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+            if char == '"':
+                self.in_string = True
+            elif char in _CLOSERS:
+                self.stack.append(_CLOSERS[char])
+                self.checkpoints.append((len(self.chars), list(self.stack)))
+            elif char in "}]":
+                if not self.stack or self.stack.pop() != char:
+                    return self._abandon(text[index + 1:])
+                if not self.stack:
+                    try:
+                        self.value = json.loads("".join(self.chars))
+                    except ValueError:
+                        return self._abandon(text[index + 1:])
+                    return ""
+            elif char == ",":
+                # Everything before the comma is a finished element
+                self.checkpoints.append((len(self.chars) - 1, list(self.stack)))
+            elif char not in _STRUCTURE_CHARS and char not in _LITERAL_CHARS:
+                return self._abandon(text[index + 1:])
+        return ""
+
+    def _abandon(self, rest: str) -> str:
+        """Drop the current candidate and rescan from just after its opening bracket"""
+        retry = "".join(self.chars[1:]) + rest
+        self._reset()
+        return retry
+
+    def _close(self, text: str, stack: List[str], in_string: bool) -> Optional[Any]:
+        if in_string:
+            text += '"'
+        else:
+            text = text.rstrip().rstrip(",")
+        try:
+            return json.loads(text + "".join(reversed(stack)))
+        except ValueError:
+            return None
+
+    def result(self) -> Tuple[Optional[Any], bool]:
+        """(parsed value or None, whether it had to be repaired)"""
+        if self.complete:
+            return self.value, False
+        if not self.chars:
+            return None, False
+        # Cut off mid-value: close what is open as it stands
+        text = "".join(self.chars)
+        tail = text[:-1] if self.escaped else text
+        value = self._close(tail, self.stack, self.in_string)
+        if value is not None:
+            return value, True
+        for length, stack in reversed(self.checkpoints):
+            value = self._close(text[:length], stack, False)
+            if value is not None:
+                return value, True
+        # Not repairable: look for a later value
+        rest = JSONExtractor()
+        rest.feed(text[1:])
+        value, _ = rest.result()
+        return value, value is not None
+
+
+def extract_json(text: str) -> Tuple[Optional[Any], bool]:
+    """First JSON value in `text`, repaired if truncated: (value or None, repaired)"""
+    extractor = JSONExtractor()
+    extractor.feed(text)
+    return extractor.result()
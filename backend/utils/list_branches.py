@@ -2,12 +2,13 @@ import subprocess
 
 from git import Optional
 
-def list_remote_branches(repo_url: str, token: Optional[str] = None) -> list[str]:
+def ls_remote_heads(repo_url: str, token: Optional[str] = None, *patterns: str) -> list[tuple[str, str]]:
+    """Run `git ls-remote --heads` and return (sha, ref) pairs"""
     if token and repo_url.startswith("https://"):
         repo_url = repo_url.replace("https://", f"https://{token}@")
 
     result = subprocess.run(
-        ["git", "ls-remote", "--heads", repo_url],
+        ["git", "ls-remote", "--heads", repo_url, *patterns],
         capture_output=True,
         text=True
     )
@@ -15,25 +16,27 @@ def list_remote_branches(repo_url: str, token: Optional[str] = None) -> list[str
     if result.returncode != 0:
         raise Exception(result.stderr.strip())
 
-    branches = []
+    heads = []
     for line in result.stdout.splitlines():
-        # refs/heads/branch-name
-        ref = line.split("\t")[1]
-        branches.append(ref.replace("refs/heads/", ""))
+        # <sha>\trefs/heads/branch-name
+        sha, ref = line.split("\t")
+        heads.append((sha, ref))
 
-    return branches
+    return heads
 
 
+def list_remote_branches(repo_url: str, token: Optional[str] = None) -> list[str]:
+    return [ref.replace("refs/heads/", "") for _, ref in ls_remote_heads(repo_url, token)]
 
-def branch_exists(repo_url: str, branch: str, token: Optional[str] = None) -> bool:
-    if token and repo_url.startswith("https://"):
-        repo_url = repo_url.replace("https://", f"https://{token}@")
 
-    result = subprocess.run(
-        ["git", "ls-remote", "--heads", repo_url, branch],
-        capture_output=True,
-        text=True
-    )
+def resolve_branch_head(repo_url: str, branch: str, token: Optional[str] = None) -> Optional[str]:
+    """Commit SHA the branch points to on the remote, or None if it does not exist"""
+    for sha, ref in ls_remote_heads(repo_url, token, branch):
+        # the pattern also matches e.g. refs/heads/feature/<branch>
+        if ref == f"refs/heads/{branch}":
+            return sha
+    return None
 
-    return bool(result.stdout.strip())
 
+def branch_exists(repo_url: str, branch: str, token: Optional[str] = None) -> bool:
+    return resolve_branch_head(repo_url, branch, token) is not None
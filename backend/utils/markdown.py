@@ -1,30 +1,93 @@
-def generate_markdown(docs: list) -> str:
-    md = "# 📘 Project Documentation\n\n"
+from typing import Dict, IO, Iterable, Iterator, Optional, Union
+from pathlib import Path
+
+# Sections are produced one at a time and written out as they come, so the
+# rendered document is never built as one string. The per-file inputs are
+# the caller's: repository jobs still hold every file's documentation.
+
+
+# ============================================================================
+# /generate-doc ANALYSES
+# ============================================================================
+
+PROJECT_HEADER = "# 📘 Project Documentation\n\n"
+
+
+def file_section(doc: dict) -> str:
+    """Markdown of one analysed file"""
+    parts = [
+        f"## {doc['file']}\n\n",
+        f"**Language:** {doc['language']}\n\n",
+        f"{doc['overview']}\n\n"
+    ]
+
+    if doc["classes"]:
+        parts.append("### Classes\n")
+        for cls in doc["classes"]:
+            parts.append(f"#### {cls['name']}\n")
+            parts.append(f"{cls.get('description', '')}\n\n")
+
+            for method in cls.get("methods", []):
+                parts.append(f"- `{method['name']}({', '.join(method.get('params', []))})`\n")
 
+    if doc["functions"]:
+        parts.append("\n### Functions\n")
+        for fn in doc["functions"]:
+            parts.append(f"- `{fn['name']}({', '.join(fn.get('params', []))}) → {fn.get('returns', '')}`\n")
+
+    if doc["notes"]:
+        parts.append("\n### Notes\n")
+        for note in doc["notes"]:
+            parts.append(f"- {note}\n")
+
+    parts.append("\n---\n\n")
+    return "".join(parts)
+
+
+def iter_markdown(docs: Iterable[dict]) -> Iterator[str]:
+    yield PROJECT_HEADER
     for doc in docs:
-        md += f"## {doc['file']}\n\n"
-        md += f"**Language:** {doc['language']}\n\n"
-        md += f"{doc['overview']}\n\n"
+        yield file_section(doc)
+
+
+def generate_markdown(docs: list) -> str:
+    return "".join(iter_markdown(docs))
+
+
+# ============================================================================
+# REPOSITORY JOBS
+# ============================================================================
 
-        if doc["classes"]:
-            md += "### Classes\n"
-            for cls in doc["classes"]:
-                md += f"#### {cls['name']}\n"
-                md += f"{cls.get('description', '')}\n\n"
+def repository_section(item: Dict[str, str]) -> str:
+    """Markdown of one documented repository file"""
+    return f"## `{item['path']}`\n\n{item['documentation']}\n"
 
-                for method in cls.get("methods", []):
-                    md += f"- `{method['name']}({', '.join(method.get('params', []))})`\n"
 
-        if doc["functions"]:
-            md += "\n### Functions\n"
-            for fn in doc["functions"]:
-                md += f"- `{fn['name']}({', '.join(fn.get('params', []))}) → {fn.get('returns', '')}`\n"
+def iter_repository_markdown(results: Iterable[Dict[str, str]], summaries: Optional[Dict] = None) -> Iterator[str]:
+    """Sections of a repository document: overview, package summaries, then every file"""
+    summaries = summaries or {}
+    yield "# Repository Documentation\n"
+    if summaries.get("repository"):
+        yield f"\n## Overview\n\n{summaries['repository']}\n"
+    if summaries.get("packages"):
+        yield "\n## Packages\n"
+        for name, summary in summaries["packages"].items():
+            yield f"\n### `{name}`\n\n{summary}\n"
+    for item in results:
+        yield "\n" + repository_section(item)
 
-        if doc["notes"]:
-            md += "\n### Notes\n"
-            for note in doc["notes"]:
-                md += f"- {note}\n"
 
-        md += "\n---\n\n"
+# ============================================================================
+# OUTPUT
+# ============================================================================
 
-    return md
+def write_markdown(sections: Iterable[str], target: Union[str, Path, IO[str]]) -> int:
+    """Write sections to a path or text file object as they are produced; returns characters written"""
+    if isinstance(target, (str, Path)):
+        with open(target, "w", encoding="utf-8") as f:
+            return write_markdown(sections, f)
+    written = 0
+    for section in sections:
+        target.write(section)
+        written += len(section)
+    return written
@@ -0,0 +1,42 @@
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Iterator, Optional
+from utils.filters import PathFilter
+
+
+def walk_files(root: Path, path_filter: Optional[PathFilter] = None,
+               stats: Optional[Counter] = None) -> Iterator[tuple[str, Path]]:
+    """Lazily yield (relative path, absolute path) for every file worth analysing.
+
+    Skipped directories are pruned before they are opened, so a checked-in
+    virtualenv costs one rejected entry instead of a walk over its tree.
+    Rejections are tallied per rule in `stats` (directory rules count pruned
+    directories, file rules count files).
+    """
+    path_filter = path_filter or PathFilter()
+    stats = stats if stats is not None else Counter()
+    stack = [(str(root), "")]
+
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        try:
+            entries = os.scandir(dir_path)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                rel_path = rel_dir + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if reason := path_filter.dir_reason(rel_path):
+                            stats[reason] += 1
+                        else:
+                            stack.append((entry.path, rel_path + "/"))
+                    elif entry.is_file(follow_symlinks=False):
+                        if reason := path_filter.file_reason(rel_path):
+                            stats[reason] += 1
+                        else:
+                            yield rel_path, Path(entry.path)
+                except OSError:
+                    continue